@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'POS Product Groups (Combo Products)',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.1.0',
     'category': 'Point of Sale',
     'summary': 'Create combo products with multiple price variants for POS',
     'description': """
@@ -22,18 +22,32 @@
     'depends': ['point_of_sale', 'product'],
     'data': [
         'security/ir.model.access.csv',
+        'data/product_group_data.xml',
         'views/product_group_views.xml',
         'views/product_template_views.xml',
+        'views/res_config_settings_views.xml',
+        'views/product_group_import_views.xml',
+        'views/pos_order_views.xml',
+        'views/pos_combo_consumption_views.xml',
+        'views/pos_combo_move_trace_views.xml',
     ],
     'assets': {
         'point_of_sale._assets_pos': [
+            'pos_product_groups/static/src/js/logger.js',
             'pos_product_groups/static/src/js/main.js',
+            'pos_product_groups/static/src/js/product_group_store.js',
+            'pos_product_groups/static/src/js/catalog_cache.js',
             'pos_product_groups/static/src/js/models.js',
             'pos_product_groups/static/src/js/orderline_patch.js',
             'pos_product_groups/static/src/js/product_group_screen.js',
             'pos_product_groups/static/src/js/product_group_popup.js',
+            'pos_product_groups/static/src/js/product_group_quick_select.js',
             'pos_product_groups/static/src/xml/product_group_screen.xml',
             'pos_product_groups/static/src/xml/product_group_popup.xml',
+            'pos_product_groups/static/src/xml/product_group_quick_select.xml',
+        ],
+        'web.assets_tests': [
+            'pos_product_groups/static/tests/tours/**/*',
         ],
     },
     'installable': True,
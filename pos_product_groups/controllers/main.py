@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from odoo import http
+from odoo.http import request
+
+from ..models import combo_metrics
+
+
+class ProductGroupMetricsController(http.Controller):
+
+    @http.route('/pos_product_groups/metrics', type='http', auth='user', methods=['GET'])
+    def combo_metrics(self, reset=None):
+        """Metrics of the combo expansion and recipe cache of the worker serving the request.
+
+        With ``?reset=1`` the counters and timings are cleared after being read.
+        """
+        if not request.env.user.has_group('point_of_sale.group_pos_manager'):
+            return request.not_found()
+        metrics = combo_metrics.get_metrics(request.env.cr.dbname)
+        snapshot = metrics.snapshot()
+        snapshot['recipe_cache'] = request.env['product.group.sub'].get_combo_recipe_cache_stats()
+        if reset:
+            metrics.reset()
+        return request.make_json_response(snapshot)
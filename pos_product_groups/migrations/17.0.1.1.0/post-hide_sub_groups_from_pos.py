@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Hide from POS the sub group products of earlier versions, shown as regular products"""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['product.group.sub']._hide_all_sub_groups_from_pos()
@@ -3,5 +3,9 @@
 from . import product_group
 from . import product_template
 from . import pos_order
+from . import pos_combo_consumption
+from . import pos_combo_move_trace
 from . import pos_session
-
+from . import pos_config
+from . import res_config_settings
+from . import stock_picking
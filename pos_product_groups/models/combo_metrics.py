@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Per-worker metrics of the combo order expansion.
+
+Counters (orders, lines expanded, components produced, price fallback
+outcomes, queries) and the timings of the last ``SAMPLE_SIZE`` runs of each
+phase, from which percentiles are computed on read. Exposed by the
+``/pos_product_groups/metrics`` controller; every worker process has its own
+registry, like the recipe cache.
+"""
+
+import threading
+from collections import defaultdict, deque
+
+SAMPLE_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+
+
+class ComboMetrics:
+    """Metrics of one database, shared by all the threads of a worker"""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.lock = threading.Lock()
+        self.sample_size = sample_size
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(lambda: deque(maxlen=self.sample_size))
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record(self, counters=None, timings=None):
+        """Add ``{name: value}`` to the counters and ``{phase: ms}`` to the timings at once"""
+        with self.lock:
+            for name, value in (counters or {}).items():
+                self.counters[name] += value
+            for phase, elapsed_ms in (timings or {}).items():
+                self.timings[phase].append(elapsed_ms)
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            timings = {phase: sorted(samples) for phase, samples in self.timings.items()}
+        result = {'counters': counters, 'timings_ms': {}}
+        for phase, samples in timings.items():
+            if not samples:
+                continue
+            summary = {'count': len(samples), 'max': samples[-1]}
+            for percentile in PERCENTILES:
+                rank = min(len(samples) - 1, round(percentile / 100 * (len(samples) - 1)))
+                summary[f'p{percentile}'] = samples[rank]
+            result['timings_ms'][phase] = summary
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.timings.clear()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_metrics(dbname):
+    """Return the metrics registry of database ``dbname``"""
+    with _registries_lock:
+        if dbname not in _registries:
+            _registries[dbname] = ComboMetrics()
+        return _registries[dbname]
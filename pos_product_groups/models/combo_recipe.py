@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Per-registry cache of compiled sub group recipes.
+
+A recipe is everything needed to expand one ``product.group.sub`` into
+component lines without touching the ORM: component products, quantities,
+list prices and the precomputed share of each component in the sub group
+price.
+
+Entries are tagged with the recipe version stored in the
+``pos_product_groups_catalog_version`` table. Every transaction that changes
+a sub group recipe, a component, a component price or the price index bumps
+that version right before committing, so other workers drop their stale
+entries on their next lookup, while the worker that made the change drops
+exactly the affected entries and keeps the rest.
+
+The same table holds a second row, the POS catalog version: the token
+registers compare to know whether their catalog is up to date. It is bumped
+by any change shown in the POS (``touch_catalog``), such as a resequence or a
+rename, and never drops a recipe.
+
+The cache also holds the price index of the POS order price fallback:
+``{(group_id, rounded price): [sub_group_ids]}`` over the active sub groups,
+plus the product group of every group product. It is rebuilt in bulk after
+any catalog change and dropped by the transactions that change a sub group
+price, display order, group or active flag.
+"""
+
+import threading
+from contextlib import contextmanager
+
+VERSION_TABLE = 'pos_product_groups_catalog_version'
+# Rows of VERSION_TABLE
+RECIPE_VERSION_ID = 1
+CATALOG_VERSION_ID = 2
+_PENDING_KEY = 'pos_product_groups.recipe_invalidation'
+_CATALOG_KEY = 'pos_product_groups.catalog_touched'
+
+
+class ComboRecipeCache:
+    """Compiled recipes of one database, shared by all the threads of a worker"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}  # {sub_group_id: (version, recipe)}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.price_index = None  # (version, digits, index)
+
+    def get(self, sub_group_id, version):
+        with self.lock:
+            entry = self.entries.get(sub_group_id)
+            if entry and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, recipe, version):
+        with self.lock:
+            self.entries[recipe['id']] = (version, recipe)
+
+    def discard(self, sub_group_ids):
+        with self.lock:
+            for sub_group_id in sub_group_ids:
+                if self.entries.pop(sub_group_id, None):
+                    self.invalidations += 1
+
+    def retag(self, old_version, new_version):
+        """Keep the entries compiled at ``old_version`` valid for ``new_version``"""
+        with self.lock:
+            for sub_group_id, (version, recipe) in list(self.entries.items()):
+                if version == old_version:
+                    self.entries[sub_group_id] = (new_version, recipe)
+            if self.price_index and self.price_index[0] == old_version:
+                self.price_index = (new_version,) + self.price_index[1:]
+
+    def get_price_index(self, version, digits):
+        with self.lock:
+            if self.price_index and self.price_index[:2] == (version, digits):
+                return self.price_index[2]
+            return None
+
+    def set_price_index(self, index, version, digits):
+        with self.lock:
+            self.price_index = (version, digits, index)
+
+    def drop_price_index(self):
+        with self.lock:
+            self.price_index = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries),
+                'invalidations': self.invalidations,
+                'ambiguous_prices': len(self.price_index[2]['ambiguous']) if self.price_index else 0,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_cache(dbname):
+    """Return the recipe cache of database ``dbname``"""
+    isolated = getattr(_local, 'cache', None)
+    if isolated is not None:
+        return isolated
+    with _caches_lock:
+        if dbname not in _caches:
+            _caches[dbname] = ComboRecipeCache()
+        return _caches[dbname]
+
+
+@contextmanager
+def isolated_cache(cr):
+    """Use a private, empty cache in the current thread.
+
+    For benchmarks running in a transaction that is rolled back afterwards:
+    the changes made so far by the transaction are no longer considered
+    pending, so their recipes can be cached, but only in the private cache,
+    which never reaches the other threads. The pending state is restored on
+    exit.
+    """
+    pending = cr.postcommit.data.pop(_PENDING_KEY, None)
+    _local.cache = ComboRecipeCache()
+    try:
+        yield _local.cache
+    finally:
+        _local.cache = None
+        cr.postcommit.data.pop(_PENDING_KEY, None)
+        if pending is not None:
+            cr.postcommit.data[_PENDING_KEY] = pending
+
+
+def init_version_table(cr):
+    cr.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            id integer PRIMARY KEY,
+            version integer NOT NULL
+        )
+    """)
+    cr.execute(f"""
+        INSERT INTO {VERSION_TABLE} (id, version) VALUES (%s, 1), (%s, 1) ON CONFLICT (id) DO NOTHING
+    """, [RECIPE_VERSION_ID, CATALOG_VERSION_ID])
+
+
+def get_version(cr):
+    """Return the recipe version visible in the current transaction"""
+    return get_versions(cr)[0]
+
+
+def get_catalog_version(cr):
+    """Return the POS catalog version visible in the current transaction"""
+    return get_versions(cr)[1]
+
+
+def get_versions(cr):
+    """Return the recipe and POS catalog versions in a single query"""
+    cr.execute(f"SELECT id, version FROM {VERSION_TABLE} WHERE id IN %s",
+               [(RECIPE_VERSION_ID, CATALOG_VERSION_ID)])
+    versions = dict(cr.fetchall())
+    return versions.get(RECIPE_VERSION_ID, 0), versions.get(CATALOG_VERSION_ID, 0)
+
+
+def price_index_pending(cr):
+    """Return whether the current, uncommitted transaction changed the price index"""
+    state = cr.postcommit.data.get(_PENDING_KEY)
+    return bool(state and state['price_index'])
+
+
+def pending_invalidations(cr):
+    """Return the sub group ids invalidated by the current, uncommitted transaction"""
+    state = cr.postcommit.data.get(_PENDING_KEY)
+    return state['ids'] if state else set()
+
+
+def invalidate(cr, sub_group_ids):
+    """Drop the recipes of ``sub_group_ids`` now, and everywhere once committed.
+
+    The local entries are dropped immediately so that the current transaction
+    recompiles them; the recipe version bump is done once per transaction in
+    a precommit hook, and the committed version is then adopted by the local
+    cache without losing the recipes that were not touched.
+    """
+    sub_group_ids = set(sub_group_ids)
+    if not sub_group_ids:
+        return
+    get_cache(cr.dbname).discard(sub_group_ids)
+    _pending_state(cr)['ids'] |= sub_group_ids
+
+
+def invalidate_price_index(cr):
+    """Drop the price index now, and everywhere once committed"""
+    get_cache(cr.dbname).drop_price_index()
+    _pending_state(cr)['price_index'] = True
+
+
+def touch_catalog(cr):
+    """Bump the POS catalog version at commit time, once per transaction.
+
+    Used for every change shown in the POS (names, prices, display order,
+    new groups, ...), so that registers holding an older version refresh
+    their catalog. The recipe version, and therefore the recipe caches of the
+    workers, are left alone.
+    """
+    if cr.precommit.data.get(_CATALOG_KEY):
+        return
+    cr.precommit.data[_CATALOG_KEY] = True
+
+    def _bump_catalog_version():
+        cr.precommit.data.pop(_CATALOG_KEY, None)
+        cr.execute(f"UPDATE {VERSION_TABLE} SET version = version + 1 WHERE id = %s", [CATALOG_VERSION_ID])
+
+    cr.precommit.add(_bump_catalog_version)
+
+
+def _pending_state(cr):
+    """Return the invalidation state of the current transaction, registering its hooks"""
+    cache = get_cache(cr.dbname)
+    state = cr.postcommit.data.get(_PENDING_KEY)
+    if state is None:
+        state = cr.postcommit.data[_PENDING_KEY] = {
+            'ids': set(), 'versions': [], 'bump_pending': False, 'price_index': False,
+        }
+
+        def _apply_committed():
+            cache.discard(state['ids'])
+            if state['price_index']:
+                cache.drop_price_index()
+            if state['versions']:
+                cache.retag(min(state['versions']) - 1, max(state['versions']))
+
+        def _drop_uncommitted():
+            cache.discard(state['ids'])
+            if state['price_index']:
+                cache.drop_price_index()
+
+        cr.postcommit.add(_apply_committed)
+        cr.postrollback.add(_drop_uncommitted)
+
+    if not state['bump_pending']:
+        state['bump_pending'] = True
+
+        def _bump_version():
+            state['bump_pending'] = False
+            cr.execute(f"UPDATE {VERSION_TABLE} SET version = version + 1 WHERE id = %s RETURNING version",
+                       [RECIPE_VERSION_ID])
+            row = cr.fetchone()
+            if row:
+                state['versions'].append(row[0])
+
+        cr.precommit.add(_bump_version)
+    return state
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class PosComboConsumption(models.Model):
+    """Daily component consumption of the combos, per POS and sub group.
+
+    One row per (date, POS, sub group, component product), incremented when
+    an order is expanded (see ``pos.order._record_combo_consumption``), so that
+    the consumption reports read a few thousand rows instead of scanning all
+    the component order lines. Rows are only written by ``_add_consumption``.
+    """
+    _name = 'pos.combo.consumption'
+    _description = 'POS Combo Component Consumption'
+    _order = 'date desc, config_id, sub_group_id, product_id'
+    _rec_name = 'product_id'
+
+    date = fields.Date(string='Date', required=True, readonly=True, index=True)
+    config_id = fields.Many2one('pos.config', string='Point of Sale', required=True, readonly=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True, ondelete='cascade')
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    product_group_id = fields.Many2one('product.group', string='Big Group', readonly=True, ondelete='cascade')
+    sub_group_id = fields.Many2one('product.group.sub', string='Sub Group', required=True, readonly=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Component', required=True, readonly=True, ondelete='cascade')
+    qty = fields.Float(string='Quantity', digits='Product Unit of Measure', readonly=True)
+    revenue = fields.Monetary(string='Allocated Revenue', readonly=True,
+                              help='Share of the sub group sales allocated to the component (see the component shares of the recipe)')
+
+    _sql_constraints = [
+        ('consumption_key_unique', 'unique(date, config_id, sub_group_id, product_id)',
+         'Combo consumption is aggregated per day, point of sale, sub group and component.'),
+    ]
+
+    @api.model
+    def _add_consumption(self, rows):
+        """Add ``rows`` to the aggregates with a single upsert, merging the rows of a same key first.
+
+        :param rows: ``(date, config_id, company_id, product_group_id,
+            sub_group_id, product_id, qty, revenue)`` tuples
+        """
+        # A key may only appear once in an upsert
+        totals = {}
+        for date, config_id, company_id, product_group_id, sub_group_id, product_id, qty, revenue in rows:
+            key = (date, config_id, sub_group_id, product_id)
+            if key in totals:
+                totals[key][6] += qty
+                totals[key][7] += revenue
+            else:
+                totals[key] = [date, config_id, company_id, product_group_id, sub_group_id, product_id, qty, revenue]
+        if not totals:
+            return
+        self.env.flush_all()
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS consumption
+                (date, config_id, company_id, product_group_id, sub_group_id, product_id, qty, revenue,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT data.date::date, data.config_id::int, data.company_id::int, data.product_group_id::int,
+                   data.sub_group_id::int, data.product_id::int, data.qty::float, data.revenue::numeric,
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM (VALUES {", ".join(["%s"] * len(totals))})
+                AS data(date, config_id, company_id, product_group_id, sub_group_id, product_id, qty, revenue)
+            ON CONFLICT (date, config_id, sub_group_id, product_id) DO UPDATE
+               SET qty = consumption.qty + EXCLUDED.qty,
+                   revenue = consumption.revenue + EXCLUDED.revenue,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, [self.env.uid, self.env.uid] + [tuple(row) for row in totals.values()])
+        self.invalidate_model()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class PosComboMoveTrace(models.Model):
+    """Orders behind a consolidated component stock move.
+
+    When the component moves of a session are consolidated at closing (see
+    ``pos.session._consolidate_combo_component_moves``), one row per order and
+    component product keeps the link between the order and the session move
+    that carried its quantity. Rows are only written by ``_add_traces``.
+    """
+    _name = 'pos.combo.move.trace'
+    _description = 'POS Combo Component Move Trace'
+    _order = 'session_id, order_id, product_id'
+    _rec_name = 'order_id'
+
+    session_id = fields.Many2one('pos.session', string='Session', required=True, readonly=True, index=True, ondelete='cascade')
+    order_id = fields.Many2one('pos.order', string='Order', required=True, readonly=True, index=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Component', required=True, readonly=True, ondelete='cascade')
+    qty = fields.Float(string='Quantity', digits='Product Unit of Measure', readonly=True)
+    move_id = fields.Many2one('stock.move', string='Stock Move', readonly=True, index='btree_not_null', ondelete='set null')
+
+    @api.model
+    def _add_traces(self, rows):
+        """Insert ``rows`` with a single query.
+
+        :param rows: ``(session_id, order_id, product_id, qty, move_id)`` tuples
+        """
+        if not rows:
+            return
+        self.env.flush_all()
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} (session_id, order_id, product_id, qty, move_id,
+                                      create_uid, create_date, write_uid, write_date)
+            SELECT data.session_id::int, data.order_id::int, data.product_id::int, data.qty::float, data.move_id::int,
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+              FROM (VALUES {", ".join(["%s"] * len(rows))}) AS data(session_id, order_id, product_id, qty, move_id)
+        """, [self.env.uid, self.env.uid] + [tuple(row) for row in rows])
+        self.invalidate_model()
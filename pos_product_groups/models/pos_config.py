@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class PosConfig(models.Model):
+    _inherit = 'pos.config'
+
+    product_group_catalog_cache = fields.Boolean(
+        string='Cache Combo Catalog on Device',
+        help='Keep the product group catalog in the browser storage of the register. '
+             'The register starts from its local copy and only downloads the changes '
+             'when the catalog version differs from the server.',
+    )
+    product_group_debug_log = fields.Boolean(
+        string='Combo Debug Logging',
+        help='Log the product group flow (selection, prices, export) in the browser console of the register. '
+             'Also enabled by opening the POS with ?debug=assets.',
+    )
+    product_group_deferred_expansion = fields.Boolean(
+        string='Deferred Combo Expansion',
+        help='Store synchronized orders with their sub group lines and expand them into component lines '
+             '(and their stock moves) in the background, so that the synchronization time does not depend '
+             'on the size of the combos. Pending orders are expanded at the latest when the session is closed.',
+    )
+    product_group_quick_select = fields.Boolean(
+        string='One-Tap Combo Selling',
+        help='Show the sub groups of every product group as price tiles above the product list, so that a combo '
+             'is added with a single tap instead of going through the selection popup. Tapping a group product '
+             'selects its row, whose tiles can then be picked with the number keys 1-9.',
+    )
+    product_group_consolidate_component_moves = fields.Boolean(
+        string='Consolidate Component Stock Moves',
+        help='With the stock updated in real time, leave the combo component lines out of the picking of each '
+             'order and move their stock when the session is closed, with one stock move per component product '
+             '(and destination) for the whole session. The orders behind each consolidated move are kept in the '
+             'combo move traces. With the stock updated at closing, Odoo already consolidates the moves.',
+    )
@@ -1,320 +1,695 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+import time
+
+import psycopg2
+
+from odoo import models, fields, api, Command
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import create_index, float_round
 import logging
 
+from . import combo_metrics
+from . import combo_recipe
+
 _logger = logging.getLogger(__name__)
 
+# Fields of a sub group line that must not be copied onto its component lines:
+# they are specific to the sub group product and can cause foreign key
+# violations (attribute values, lots) or a second expansion when reused.
+COMPONENT_LINE_FIELDS_TO_REMOVE = (
+    'product_sub_group_id',
+    'product_group_id',
+    'combo',
+    'attribute_value_ids',
+    'custom_attribute_value_ids',
+    'pack_lot_ids',
+    'id',
+    'uuid',
+    'skip_change',
+    'price_subtotal',
+    'price_subtotal_incl',
+    'price_total',
+)
+
+
+# ir.config_parameter: number of orders of a synchronized batch committed
+# together (0 or unset: the whole batch in the request transaction)
+SYNC_CHUNK_SIZE_PARAM = 'pos_product_groups.sync_commit_chunk_size'
+# Context key set by the register when it synchronizes its orders: only that
+# RPC commits by chunks, never the server side callers of create_from_ui
+SYNC_COMMIT_CONTEXT_KEY = 'pos_combo_sync_commit'
+
+
+# Errors of a combo order caused by its data, which quarantine the order.
+# Concurrency errors (serialization failures, deadlocks) are psycopg2
+# OperationalErrors and are re-raised instead, so that Odoo retries the whole
+# request like for core ``_process_saved_order``.
+COMBO_DATA_ERRORS = (
+    UserError, ValidationError, ValueError, TypeError, KeyError,
+    psycopg2.IntegrityError, psycopg2.DataError,
+)
+
+
+# Compact wire format: the register sends a sub group line as a regular line
+# plus ``'combo': [sub_group_id, catalog_version]``; names and group data are
+# resolved from the recipe. Lines in the previous format (explicit
+# ``product_sub_group_id``/names on every line) are still accepted.
+COMBO_LINE_KEY = 'combo'
+
+
+def _line_sub_group_id(line_data):
+    """Return the sub group id of a line in either wire format"""
+    combo = line_data.get(COMBO_LINE_KEY)
+    if combo:
+        return combo[0]
+    return line_data.get('product_sub_group_id')
+
+
+def _price_index_candidates(price_index, digits, line_data):
+    """Return the sub groups matching the product and rounded unit price of a line"""
+    product_group_id = price_index['product_groups'].get(line_data.get('product_id'))
+    if not product_group_id:
+        return []
+    price = float_round(line_data.get('price_unit') or 0.0, precision_digits=digits)
+    return price_index['sub_groups'].get((product_group_id, price), [])
+
 
 class PosOrder(models.Model):
     _inherit = 'pos.order'
 
+    combo_expansion_state = fields.Selection([
+        ('none', 'No Combo'),
+        ('pending', 'Pending'),
+        ('expanded', 'Expanded'),
+        ('failed', 'Failed'),
+    ], string='Combo Expansion', default='none', readonly=True, copy=False,
+        help='Pending orders were synchronized with their sub group lines, which are expanded into '
+             'component lines in the background (see the Deferred Combo Expansion POS setting).')
+    combo_expansion_error = fields.Text(string='Combo Expansion Error', readonly=True, copy=False)
+    combo_component_moves_deferred = fields.Boolean(
+        string='Component Moves at Closing', readonly=True, copy=False,
+        help='The stock of the component lines of this order is moved with the consolidated moves of its session '
+             '(see the Consolidate Component Stock Moves POS setting).')
+
+    def init(self):
+        super().init()
+        # The expansion cron only looks for the few pending orders
+        create_index(self.env.cr, 'pos_order_combo_expansion_pending_index', self._table,
+                     ['combo_expansion_state'], where="combo_expansion_state IN ('pending', 'failed')")
+
+    @api.model
+    def create_from_ui(self, orders, draft=False):
+        """Expand the sub groups of the whole sync batch with a single prefetch"""
+        ui_orders = [
+            order['data'] for order in orders
+            if isinstance(order, dict) and isinstance(order.get('data'), dict) and order['data'].get('lines')
+        ]
+        if ui_orders:
+            prepared = iter(self._prepare_combo_orders(ui_orders))
+            orders = [
+                dict(order, data=next(prepared))
+                if isinstance(order, dict) and isinstance(order.get('data'), dict) and order['data'].get('lines')
+                else order
+                for order in orders
+            ]
+        chunk_size = 0
+        if self.env.context.get(SYNC_COMMIT_CONTEXT_KEY):
+            chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(SYNC_CHUNK_SIZE_PARAM, 0) or 0)
+        if chunk_size <= 0 or len(orders) <= chunk_size:
+            return super(PosOrder, self).create_from_ui(orders, draft=draft)
+        # Commit large batches by chunks: a retried sync skips the orders
+        # already stored (matched on their reference by create_from_ui)
+        result = []
+        for start in range(0, len(orders), chunk_size):
+            result += super(PosOrder, self).create_from_ui(orders[start:start + chunk_size], draft=draft)
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+        return result
+
+    @api.model
+    def _process_order(self, order, draft, existing_order):
+        """Process each expanded combo order in its own savepoint.
+
+        If storing the expanded order fails because of its data (see
+        ``COMBO_DATA_ERRORS``), it is stored instead with its sub group lines
+        as sold and the ``failed`` expansion state, to be reviewed and expanded
+        again later, rather than failing the whole synchronized batch.
+        """
+        data = order.get('data') if isinstance(order, dict) else None
+        if not (isinstance(data, dict) and data.get('combo_expansion_state') == 'expanded'):
+            return super(PosOrder, self)._process_order(order, draft, existing_order)
+        try:
+            with self.env.cr.savepoint():
+                order_id = super(PosOrder, self)._process_order(order, draft, existing_order)
+                self.browse(order_id)._record_combo_consumption(data.get('combo_consumption'))
+                return order_id
+        except psycopg2.OperationalError:
+            raise
+        except COMBO_DATA_ERRORS as e:
+            quarantined = dict(order, data=self._quarantine_combo_order(data, e))
+            return super(PosOrder, self)._process_order(quarantined, draft, existing_order)
+
+    @api.model
+    def _quarantine_combo_order(self, ui_order, error):
+        """Return ``ui_order`` as sold, with its sub group lines, in the ``failed`` expansion state"""
+        _logger.warning(f"Framar Product Groups: Combo order {ui_order.get('name')} quarantined: {error}")
+        combo_metrics.get_metrics(self.env.cr.dbname).incr('orders_quarantined')
+        source = dict(ui_order, lines=ui_order.get('combo_source_lines', ui_order['lines']))
+        return dict(
+            self._defer_combo_lines(source),
+            combo_expansion_state='failed',
+            combo_expansion_error=str(error),
+        )
+
     @api.model
     def _order_fields(self, ui_order):
         """Override to expand product sub groups into components before processing"""
-        _logger.info("Framar Product Groups: _order_fields called")
-        _logger.info(f"Framar Product Groups: ui_order type: {type(ui_order)}")
-        _logger.info(f"Framar Product Groups: ui_order keys: {list(ui_order.keys()) if isinstance(ui_order, dict) else 'not a dict'}")
-        
         # Ensure ui_order is a dict (it should be, but be safe)
         if not isinstance(ui_order, dict):
             return super(PosOrder, self)._order_fields(ui_order)
-        
-        # Process lines to expand product sub groups
+
+        if ui_order.get('lines') and not ui_order.get('combo_lines_expanded'):
+            ui_order = self._prepare_combo_orders([ui_order])[0]
+        elif not ui_order.get('lines'):
+            _logger.warning("Framar Product Groups: No lines found in ui_order")
+
+        result = super(PosOrder, self)._order_fields(ui_order)
+        if ui_order.get('combo_expansion_state'):
+            result['combo_expansion_state'] = ui_order['combo_expansion_state']
+            result['combo_expansion_error'] = ui_order.get('combo_expansion_error', False)
+        return result
+
+    @api.model
+    def _prepare_combo_orders(self, ui_orders):
+        """Return ``ui_orders`` with their sub group lines expanded now or left pending.
+
+        Orders of sessions using the deferred expansion keep their sub group
+        lines (see ``_expand_pending_combo_lines``); the others are expanded
+        together by ``_expand_combo_batch``. Orders to invoice are never
+        deferred: their invoice is built from their lines right away.
+        """
+        deferred_session_ids = self._get_deferred_combo_session_ids(ui_orders)
+        prepared = {}
+        to_defer = []
+        to_expand = []
+        for index, ui_order in enumerate(ui_orders):
+            if ui_order.get('pos_session_id') in deferred_session_ids and not ui_order.get('to_invoice') and any(
+                    _line_sub_group_id(line_data) for line_data in self._iter_combo_line_data([ui_order])):
+                to_defer.append(index)
+            else:
+                to_expand.append(index)
+        if to_defer:
+            existing_ids = self._get_existing_combo_sub_group_ids([ui_orders[index] for index in to_defer])
+            prepared.update((index, self._defer_combo_lines(ui_orders[index], existing_ids)) for index in to_defer)
+            combo_metrics.get_metrics(self.env.cr.dbname).incr('orders_deferred', len(to_defer))
+            self.env.ref('pos_product_groups.ir_cron_expand_pending_combo_orders').sudo()._trigger()
+        if to_expand:
+            expanded_orders = self._expand_combo_batch([ui_orders[index] for index in to_expand])
+            prepared.update(zip(to_expand, expanded_orders))
+        return [prepared[index] for index in range(len(ui_orders))]
+
+    @api.model
+    def _get_deferred_combo_session_ids(self, ui_orders):
+        """Return the ids of the sessions of ``ui_orders`` configured for the deferred expansion"""
+        session_ids = {ui_order.get('pos_session_id') for ui_order in ui_orders} - {None, False}
+        if not session_ids:
+            return set()
+        sessions = self.env['pos.session'].sudo().search_fetch([
+            ('id', 'in', list(session_ids)),
+            ('config_id.product_group_deferred_expansion', '=', True),
+        ], ['id'])
+        return set(sessions.ids)
+
+    @api.model
+    def _get_existing_combo_sub_group_ids(self, ui_orders):
+        """Return the ids of the sub groups sold by ``ui_orders`` that still exist"""
+        sub_group_ids = {_line_sub_group_id(line_data) for line_data in self._iter_combo_line_data(ui_orders)}
+        sub_group_ids = [sub_group_id for sub_group_id in sub_group_ids if sub_group_id and isinstance(sub_group_id, int)]
+        if not sub_group_ids:
+            return set()
+        return set(self.env['product.group.sub'].sudo().browse(sub_group_ids).exists().ids)
+
+    @api.model
+    def _defer_combo_lines(self, ui_order, existing_sub_group_ids=None):
+        """Return a copy of ``ui_order`` storing its sub group lines as they are, pending expansion.
+
+        :param existing_sub_group_ids: ids of the sub groups known to exist,
+            looked up when not given (see ``_get_existing_combo_sub_group_ids``)
+        """
+        if existing_sub_group_ids is None:
+            existing_sub_group_ids = self._get_existing_combo_sub_group_ids([ui_order])
+        lines = []
+        for line_tuple in ui_order['lines']:
+            if isinstance(line_tuple, (list, tuple)) and len(line_tuple) >= 3 and isinstance(line_tuple[2], dict):
+                product_sub_group_id = _line_sub_group_id(line_tuple[2])
+                if product_sub_group_id:
+                    line_tuple = self._decode_combo_line(
+                        line_tuple, product_sub_group_id if product_sub_group_id in existing_sub_group_ids else False)
+            lines.append(line_tuple)
+        return dict(ui_order, lines=lines, combo_lines_expanded=True, combo_expansion_state='pending')
+
+    def _expand_pending_combo_lines(self):
+        """Replace the stored sub group lines of the pending or failed orders of ``self`` by their component lines.
+
+        All the orders share one prefetch; each one is expanded in its own
+        savepoint and marked ``failed`` with the error if that fails, keeping
+        its sub group lines. The stock pickings skipped while the order was
+        pending are created once it is expanded.
+        """
+        orders = self.filtered(lambda order: order.combo_expansion_state in ('pending', 'failed'))
+        if not orders:
+            return orders
+        combo_lines = {
+            order: order.lines.filtered(lambda line: not line.is_component and (
+                line.product_sub_group_id or line.product_id.is_product_group))
+            for order in orders
+        }
+        line_data = {line: line._get_combo_line_data() for lines in combo_lines.values() for line in lines}
+        combo_data = self._prefetch_combo_data([{'lines': [(0, 0, data) for data in line_data.values()]}])
+        Line = self.env['pos.order.line']
+        for order in orders:
+            try:
+                with self.env.cr.savepoint():
+                    to_replace = Line
+                    for line in combo_lines[order]:
+                        data = line_data[line]
+                        data['product_sub_group_id'] = self._resolve_combo_sub_group_id(data, combo_data)
+                        recipe = combo_data['sub_groups'].get(data['product_sub_group_id'])
+                        if recipe and recipe['components']:
+                            to_replace |= line
+                    expanded = self._expand_combo_lines(
+                        {'lines': [(0, 0, line_data[line]) for line in to_replace]}, combo_data)
+                    commands = [Command.delete(line.id) for line in to_replace]
+                    commands += [
+                        Command.create({key: value for key, value in data.items() if key in Line._fields})
+                        for _0, _1, data in expanded['lines']
+                    ]
+                    order.write({
+                        'lines': commands,
+                        'combo_expansion_state': 'expanded',
+                        'combo_expansion_error': False,
+                    })
+                    if order.state not in ('draft', 'cancel') and not order.picking_ids:
+                        order._create_order_picking()
+                    order._record_combo_consumption(expanded.get('combo_consumption'))
+            except psycopg2.OperationalError:
+                raise
+            except COMBO_DATA_ERRORS as e:
+                _logger.warning(f"Framar Product Groups: Could not expand the combo lines of order {order.name}: {e}")
+                order.write({'combo_expansion_state': 'failed', 'combo_expansion_error': str(e)})
+        return orders
+
+    @api.model
+    def _cron_expand_pending_combo_orders(self, batch_size=200):
+        """Expand the pending combo orders by chunks of ``batch_size``, committing each chunk"""
+        domain = [('combo_expansion_state', '=', 'pending')]
+        total = self.search_count(domain)
+        done = 0
+        while True:
+            orders = self.search(domain, limit=batch_size, order='id')
+            if not orders:
+                break
+            orders._expand_pending_combo_lines()
+            done += len(orders)
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+            _logger.info(f"Expanded pending combo orders: {done}/{total}")
+        return done
+
+    def action_expand_combo_lines(self):
+        """Expand the combo lines of the selected pending or failed orders now"""
+        orders = self._expand_pending_combo_lines()
+        failed = orders.filtered(lambda order: order.combo_expansion_state == 'failed')
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'warning' if failed else 'success',
+                'message': f'{len(orders) - len(failed)} orders expanded, {len(failed)} failed.',
+            },
+        }
+
+    def _record_combo_consumption(self, consumption):
+        """Add the components consumed by the expansion of order ``self`` to ``pos.combo.consumption``.
+
+        Only orders that are no longer drafts count: a draft order is
+        synchronized (and expanded) again when it is paid.
+
+        :param consumption: ``combo_consumption`` of the expanded UI order, see ``_expand_combo_lines``
+        """
+        self.ensure_one()
+        if not consumption or self.state in ('draft', 'cancel'):
+            return
+        date = fields.Date.context_today(self, self.date_order)
+        config_id = self.session_id.config_id.id
+        self.env['pos.combo.consumption'].sudo()._add_consumption([
+            (date, config_id, self.company_id.id, product_group_id, sub_group_id, product_id, qty, revenue)
+            for product_group_id, sub_group_id, product_id, qty, revenue in consumption
+        ])
+
+    def _create_order_picking(self):
+        """Pending and failed combo orders get their picking once expanded into components.
+
+        A failed (quarantined) order keeps its sub group lines: a picking now
+        would move the stock of the group product, and block the one of its
+        components when the expansion is retried.
+        With the consolidation option, the picking of the order leaves out its
+        component lines, moved at session close instead.
+        """
+        if self.combo_expansion_state in ('pending', 'failed'):
+            return
+        if self._should_consolidate_combo_component_moves():
+            self.combo_component_moves_deferred = True
+            return super(PosOrder, self.with_context(pos_combo_skip_component_lines=True))._create_order_picking()
+        return super(PosOrder, self)._create_order_picking()
+
+    def _should_consolidate_combo_component_moves(self):
+        """Whether the stock of the component lines of order ``self`` is moved at session close.
+
+        Only when the stock is updated in real time (at closing Odoo already
+        consolidates the moves of the session) and the order has no picking
+        of its own to follow: no shipping date, no invoice with anglo-saxon
+        accounting.
+        """
+        self.ensure_one()
+        return bool(
+            self.config_id.product_group_consolidate_component_moves
+            and not self.session_id.update_stock_at_closing
+            and not self.shipping_date
+            and not (self.company_id.anglo_saxon_accounting and self.to_invoice)
+            and any(line.is_component for line in self.lines)
+        )
+
+    @api.model
+    def _expand_combo_batch(self, ui_orders):
+        """Prefetch and expand ``ui_orders``, recording the metrics of the batch.
+
+        Logs a single summary line per batch; the per line traces of the
+        expansion are only emitted at debug level.
+        """
+        metrics = combo_metrics.get_metrics(self.env.cr.dbname)
+        queries_before = self.env.cr.sql_log_count
+        started_at = time.perf_counter()
+        combo_data = self._prefetch_combo_data(ui_orders)
+        prefetch_ms = (time.perf_counter() - started_at) * 1000
+        prefetch_queries = self.env.cr.sql_log_count - queries_before
+        metrics.record(
+            counters={'batches': 1, 'prefetch_queries': prefetch_queries},
+            timings={'prefetch': prefetch_ms},
+        )
+
+        expanded_orders = []
+        for ui_order in ui_orders:
+            try:
+                expanded_orders.append(self._expand_combo_lines(ui_order, combo_data))
+            except COMBO_DATA_ERRORS as e:
+                # Malformed line data: store the order as sold for review
+                expanded_orders.append(self._quarantine_combo_order(ui_order, e))
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        metrics.record(timings={'batch': elapsed_ms})
+        _logger.info(
+            "Framar Product Groups: Expanded %s orders (%s sub groups) in %.1f ms, %s queries",
+            len(ui_orders), len(combo_data['sub_groups']), elapsed_ms, prefetch_queries,
+        )
+        return expanded_orders
+
+    @api.model
+    def _iter_combo_line_data(self, ui_orders):
+        """Yield the data dict of every ``(0, 0, {...})`` line of ``ui_orders``"""
+        for ui_order in ui_orders:
+            for line_tuple in ui_order.get('lines') or []:
+                if isinstance(line_tuple, (list, tuple)) and len(line_tuple) >= 3 and isinstance(line_tuple[2], dict):
+                    yield line_tuple[2]
+
+    @api.model
+    def _prefetch_combo_data(self, ui_orders):
+        """Load everything needed to expand the sub group lines of ``ui_orders``.
+
+        The number of queries is constant whatever the number of orders, lines
+        and components: the recipe and catalog versions, then the price index of the
+        lines sold without a sub group (see
+        ``product.group.sub._get_combo_price_index``) and the recipes (see
+        ``product.group.sub._get_combo_recipes``), both served from the worker
+        cache unless the catalog changed. The result
+        only holds plain Python values so that the expansion itself never
+        touches the ORM.
+        """
+        sub_group_ids = set()
+        fallback_lines = []
+        catalog_versions = set()
+        for line_data in self._iter_combo_line_data(ui_orders):
+            product_sub_group_id = _line_sub_group_id(line_data)
+            if product_sub_group_id:
+                sub_group_ids.add(product_sub_group_id)
+                if line_data.get(COMBO_LINE_KEY):
+                    catalog_versions.add(line_data[COMBO_LINE_KEY][1])
+            elif line_data.get('product_id') and not line_data.get('is_component'):
+                fallback_lines.append(line_data)
+
+        SubGroup = self.env['product.group.sub']
+        version, catalog_version = combo_recipe.get_versions(self.env.cr)
+
+        # FALLBACK: lines of a product group without product_sub_group_id are
+        # matched by price through the worker price index (no query once built)
+        price_index = {'product_groups': {}, 'sub_groups': {}, 'ambiguous': {}}
+        price_digits = self.env.company.currency_id.decimal_places
+        if fallback_lines:
+            price_index = SubGroup._get_combo_price_index(version, price_digits)
+            for line_data in fallback_lines:
+                candidates = _price_index_candidates(price_index, price_digits, line_data)
+                if len(candidates) == 1:
+                    sub_group_ids.add(candidates[0])
+
+        sub_groups = {}
+        if sub_group_ids:
+            sub_groups = SubGroup._get_combo_recipes(sub_group_ids, version=version)
+
+        # Lines sold against an older catalog are expanded with the current
+        # recipe; the sold price still comes from the line itself
+        catalog_versions.discard(None)
+        if catalog_versions:
+            stale_versions = sorted(v for v in catalog_versions if v != catalog_version)
+            if stale_versions:
+                combo_metrics.get_metrics(self.env.cr.dbname).incr('stale_catalog_batches')
+                _logger.debug("Framar Product Groups: Orders sold with catalog versions %s, current version is %s", stale_versions, catalog_version)
+
+        return {
+            'sub_groups': sub_groups,
+            'price_index': price_index,
+            'price_digits': price_digits,
+        }
+
+    @api.model
+    def _resolve_combo_sub_group_id(self, line_data, combo_data):
+        """Return the sub group a line stands for, using the price fallback if needed"""
+        product_sub_group_id = _line_sub_group_id(line_data)
+        product_id = line_data.get('product_id')
+        if product_sub_group_id or not product_id or line_data.get('is_component'):
+            return product_sub_group_id
+        product_group_id = combo_data['price_index']['product_groups'].get(product_id)
+        if not product_group_id:
+            return product_sub_group_id
+        price_unit = line_data.get('price_unit')
+        candidates = _price_index_candidates(combo_data['price_index'], combo_data['price_digits'], line_data)
+        metrics = combo_metrics.get_metrics(self.env.cr.dbname)
+        if len(candidates) == 1:
+            product_sub_group_id = candidates[0]
+            metrics.incr('fallback_hits')
+            _logger.debug("Framar Product Groups: ✓ Found matching sub group %s by price %s", product_sub_group_id, price_unit)
+        elif candidates:
+            # Never pick one arbitrarily: the line is kept as sold and reported
+            metrics.incr('fallback_ambiguous')
+            _logger.warning(f"Framar Product Groups: Price {price_unit} is ambiguous for product group {product_group_id}, sub groups {candidates} share it; line not expanded")
+        else:
+            metrics.incr('fallback_misses')
+            _logger.warning(f"Framar Product Groups: No sub group found for product group {product_group_id} with price {price_unit}")
+        return product_sub_group_id
+
+    @api.model
+    def _decode_combo_line(self, line_tuple, product_sub_group_id, sub_group=None):
+        """Return a sub group line kept unexpanded, in the explicit format stored on the order line.
+
+        ``product_sub_group_id`` is False for a sub group that no longer
+        exists: the line only keeps the name it was sold under, as its id
+        would violate the foreign key and fail the whole synchronized batch.
+        """
+        line_data = {key: value for key, value in line_tuple[2].items() if key != COMBO_LINE_KEY}
+        line_data['product_sub_group_id'] = product_sub_group_id
+        if sub_group:
+            line_data.setdefault('product_sub_group_name', sub_group['name'])
+            line_data.setdefault('product_group_name', sub_group['product_group_name'])
+        elif not product_sub_group_id and not line_data.get('product_sub_group_name'):
+            line_data['product_sub_group_name'] = line_data.get('full_product_name')
+        return (line_tuple[0], line_tuple[1], line_data)
+
+    @api.model
+    def _expand_combo_lines(self, ui_order, combo_data):
+        """Return a copy of ``ui_order`` whose sub group lines are replaced by component lines.
+
+        Pure Python over ``combo_data`` (see ``_prefetch_combo_data``). Each sub
+        group line distributes its total price over its components using the
+        precomputed shares of its recipe; components sold by several
+        lines are merged into a single line per product, appended after the
+        regular lines.
+        """
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        started_at = time.perf_counter()
+        resolve_time = 0.0
+        lines_expanded = lines_kept = 0
         processed_lines = []
-                        # Track components by product_id to combine duplicates
-        component_map = {}  # {product_id: {data, total_qty, total_price, sub_group_unit_prices}}
-        
-        if ui_order.get('lines'):
-            _logger.info(f"Framar Product Groups: Processing {len(ui_order['lines'])} order lines")
-            for line_index, line_tuple in enumerate(ui_order['lines']):
-                _logger.info(f"Framar Product Groups: Processing line {line_index}: {type(line_tuple)}")
-                
-                # Line format is (0, 0, {...}) where index 2 is the data dict
-                if isinstance(line_tuple, (list, tuple)) and len(line_tuple) >= 3:
-                    line_data = line_tuple[2]
-                    _logger.info(f"Framar Product Groups: Line {line_index} data keys: {list(line_data.keys()) if isinstance(line_data, dict) else 'not a dict'}")
-                    _logger.info(f"Framar Product Groups: Line {line_index} has product_sub_group_id: {line_data.get('product_sub_group_id') if isinstance(line_data, dict) else 'N/A'}")
-                    
-                    # Check if this line has product_sub_group_id (indicates it's a sub group)
-                    product_sub_group_id = line_data.get('product_sub_group_id')
-                    product_sub_group_name = line_data.get('product_sub_group_name')
-                    product_id = line_data.get('product_id')
-                    price_unit = line_data.get('price_unit')
-                    full_product_name = line_data.get('full_product_name', '')
-                    
-                    _logger.info(f"Framar Product Groups: Checking line - product_id: {product_id}, price_unit: {price_unit}, product_sub_group_id: {product_sub_group_id}")
-                    
-                    # FALLBACK: If product_sub_group_id is missing but product is a product group, find sub group by price
-                    if not product_sub_group_id and product_id:
-                        try:
-                            product = self.env['product.product'].browse(product_id)
-                            if product.exists() and product.is_product_group and product.product_group_id:
-                                # This is a product group - find the sub group that matches the price
-                                _logger.info(f"Framar Product Groups: Product {product_id} is a product group, looking for sub group with price {price_unit}")
-                                product_group = product.product_group_id
-                                
-                                # Find sub group that matches the price
-                                matching_sub_group = self.env['product.group.sub'].search([
-                                    ('product_group_id', '=', product_group.id),
-                                    ('price', '=', price_unit),
-                                    ('active', '=', True)
-                                ], limit=1)
-                                
-                                if matching_sub_group:
-                                    product_sub_group_id = matching_sub_group.id
-                                    _logger.info(f"Framar Product Groups: ✓ Found matching sub group {product_sub_group_id} by price {price_unit}")
-                                else:
-                                    _logger.warning(f"Framar Product Groups: No sub group found for product group {product_group.id} with price {price_unit}")
-                        except Exception as e:
-                            _logger.warning(f"Framar Product Groups: Error in fallback detection: {e}")
-                    
-                    if isinstance(line_data, dict) and product_sub_group_id:
-                        qty = line_data.get('qty', 1)
-                        _logger.info(f"Framar Product Groups: Found sub group ID {product_sub_group_id} in line {line_index}")
-                        
-                        _logger.info(f"Framar Product Groups: Expanding sub group {product_sub_group_id} with qty {qty}")
-                        _logger.info(f"Framar Product Groups: Line data keys: {list(line_data.keys())}")
-                        
-                        # Get the product sub group
-                        sub_group = self.env['product.group.sub'].browse(product_sub_group_id)
-                        
-                        if not sub_group.exists():
-                            _logger.warning(f"Framar Product Groups: Sub group {product_sub_group_id} not found, keeping original line")
-                            processed_lines.append(line_tuple)
-                            continue
-                        
-                        if not sub_group.component_ids:
-                            _logger.warning(f"Framar Product Groups: Sub group {product_sub_group_id} has no components, keeping original line")
-                            processed_lines.append(line_tuple)
-                            continue
-                        
-                        # Get original price from the sub group line - this is the UNIT price of the sub-group
-                        original_price_unit = line_data.get('price_unit', sub_group.price)
-                        sub_group_total_price = original_price_unit * qty  # Total price for this sub group order
-                        
-                        _logger.info(f"Framar Product Groups: Sub group {product_sub_group_id} - qty: {qty}, price_unit: {original_price_unit}, total: {sub_group_total_price}")
-                        
-                        # FIRST PASS: Calculate base values for price distribution
-                        # Get each component's unit price and calculate proportional distribution
-                        component_base_values = {}  # {product_id: base_value}
-                        total_base_value = 0.0
-                        
-                        for component in sub_group.component_ids:
-                            component_product = component.product_id
-                            if not component_product:
-                                continue
-                            
-                            # Get component's unit price (list_price)
-                            component_unit_price = component_product.list_price or 0.0
-                            
-                            # Base value = unit price × quantity per sub-group
-                            component_base_value = component_unit_price * component.quantity
-                            component_base_values[component_product.id] = component_base_value
-                            total_base_value += component_base_value
-                            
-                            _logger.info(f"Framar Product Groups: Component {component_product.name} - unit_price: {component_unit_price}, qty_per_subgroup: {component.quantity}, base_value: {component_base_value}")
-                        
-                        _logger.info(f"Framar Product Groups: Total base value: {total_base_value}, sub-group price: {original_price_unit}")
-                        
-                        # Expand into components
-                        component_index = 0
-                        _logger.info(f"Framar Product Groups: Found {len(sub_group.component_ids)} components to expand")
-                        
-                        for component in sub_group.component_ids:
-                            # Create a new line tuple for each component
-                            component_line_data = line_data.copy()
-                            
-                            # CRITICAL: Remove fields that are specific to the sub-group product
-                            # These can cause foreign key violations when used with component products
-                            fields_to_remove = [
-                                'product_sub_group_id',  # Remove so it doesn't get expanded again
-                                'product_group_id',  # Remove big group ID
-                                'attribute_value_ids',  # Component products have different/no attributes - THIS WAS CAUSING THE ERROR!
-                                'custom_attribute_value_ids',  # Custom attributes are product-specific
-                                'pack_lot_ids',  # Lot tracking is product-specific
-                                'id',  # Remove any existing line ID
-                                'uuid',  # Remove UUID - new line needs new UUID
-                                'skip_change',  # Reset flags
-                                'price_subtotal',  # Remove old subtotal - will be calculated for component
-                                'price_subtotal_incl',  # Remove old subtotal incl - will be calculated for component
-                                'price_total',  # Remove old total - will be calculated for component
-                            ]
-                            
-                            for field in fields_to_remove:
-                                component_line_data.pop(field, None)
-                            
-                            # Calculate component quantity based on sub group quantity
-                            component_qty = component.quantity * qty
-                            
-                            # Get the component product - handle both direct access and browse
-                            component_product = component.product_id
-                            if not component_product:
-                                _logger.error(f"Framar Product Groups: Component {component.id} has no product_id!")
-                                continue
-                            
-                            component_product_id = component_product.id if hasattr(component_product, 'id') else component_product
-                            component_product_name = component_product.name if hasattr(component_product, 'name') else str(component_product)
-                            
-                            _logger.info(f"Framar Product Groups: Expanding component {component.id}: {component_product_name} (id: {component_product_id}) x {component_qty}")
-                            
-                            # Get component's own unit price
-                            component_unit_price = component_product.list_price or 0.0
-                            
-                            # Calculate proportional price for this component based on its base value
-                            # This ensures the component carries the right portion of the sub-group price
-                            component_base_value = component_base_values.get(component_product_id, 0.0)
-                            
-                            if total_base_value > 0 and component_base_value > 0:
-                                # Proportional distribution: component gets its share based on base value
-                                component_price_portion = (component_base_value / total_base_value) * sub_group_total_price
-                            else:
-                                # Fallback: if no base values, use component's own unit price × quantity
-                                component_price_portion = component_unit_price * component_qty
-                                _logger.warning(f"Framar Product Groups: No base value for {component_product_name}, using component unit price × qty")
-                            
-                            # Store component's unit price for later use
-                            # This ensures the unit price displayed matches the component's actual price
-                            
-                            _logger.info(f"Framar Product Groups: Component {component_product_name} - unit_price: {component_unit_price}, base_value: {component_base_value}, price_portion: {component_price_portion} (for qty: {component_qty})")
-                            
-                            # Check if this component product already exists in our map
-                            if component_product_id in component_map:
-                                # Component already exists - combine quantities and prices
-                                existing = component_map[component_product_id]
-                                existing['total_qty'] += component_qty
-                                existing['total_price'] += component_price_portion
-                                
-                                # Verify unit price consistency - all occurrences should have the same unit price
-                                if 'component_unit_price' in existing:
-                                    if abs(existing['component_unit_price'] - component_unit_price) > 0.01:
-                                        _logger.warning(f"Framar Product Groups: Component {component_product_name} has different unit prices: {existing['component_unit_price']} vs {component_unit_price}, keeping first")
-                                else:
-                                    existing['component_unit_price'] = component_unit_price
-                                
-                                # Keep track of all sub groups this component came from
-                                if 'sub_groups' not in existing:
-                                    existing['sub_groups'] = []
-                                existing['sub_groups'].append(sub_group.name)
-                                
-                                # Track sub-group unit prices for reference
-                                if 'sub_group_unit_prices' not in existing:
-                                    existing['sub_group_unit_prices'] = []
-                                existing['sub_group_unit_prices'].append({
-                                    'sub_group_name': sub_group.name,
-                                    'unit_price': original_price_unit,
-                                    'qty': qty,
-                                    'component_qty': component_qty,
-                                    'component_price_portion': component_price_portion,
-                                })
-                                
-                                _logger.info(f"Framar Product Groups: Combined component {component_product_name}: total qty now {existing['total_qty']}, total price now {existing['total_price']}, added {component_price_portion}")
-                            else:
-                                # First occurrence of this component - add to map
-                                component_line_data.update({
-                                    'product_id': component_product_id,
-                                    'qty': component_qty,
-                                    'price_unit': component_unit_price,  # Use component's own unit price
-                                    'full_product_name': component_product_name,
-                                    'is_component': True,
-                                    'product_sub_group_name': sub_group.name,
-                                    'product_group_name': sub_group.product_group_id.name if sub_group.product_group_id else '',
-                                })
-                                component_map[component_product_id] = {
-                                    'data': component_line_data,
-                                    'total_qty': component_qty,
-                                    'total_price': component_price_portion,  # Proportional price for this component
-                                    'component_unit_price': component_unit_price,  # Store component's unit price
-                                    'sub_groups': [sub_group.name],
-                                    'sub_group_unit_prices': [{
-                                        'sub_group_name': sub_group.name,
-                                        'unit_price': original_price_unit,
-                                        'qty': qty,
-                                        'component_qty': component_qty,
-                                        'component_price_portion': component_price_portion,
-                                    }],
-                                }
-                                _logger.info(f"Framar Product Groups: Added component {component_product_name} x {component_qty}, unit_price: {component_unit_price}, price_portion: {component_price_portion}")
-                            component_index += 1
-                        
-                        _logger.info(f"Framar Product Groups: ✓ Expanded sub group {product_sub_group_id} into {component_index} component entries")
-                    else:
-                        # Regular product (not a sub group component), keep as is
-                        _logger.info(f"Framar Product Groups: Line {line_index} is a regular product, keeping as is")
-                        processed_lines.append(line_tuple)
-                
+        # Track components by product_id to combine duplicates
+        component_map = {}  # {product_id: {data, total_qty, total_price, component_unit_price}}
+        # Consumption per sub group, which the merged component lines lose
+        consumption = {}  # {(sub_group_id, product_id): [product_group_id, qty, revenue]}
+
+        for line_index, line_tuple in enumerate(ui_order['lines']):
+            # Line format is (0, 0, {...}) where index 2 is the data dict
+            if not (isinstance(line_tuple, (list, tuple)) and len(line_tuple) >= 3 and isinstance(line_tuple[2], dict)):
+                _logger.warning(f"Framar Product Groups: Line {line_index} is not in expected tuple format, keeping as is")
+                processed_lines.append(line_tuple)
+                continue
+
+            line_data = line_tuple[2]
+            resolve_started_at = time.perf_counter()
+            product_sub_group_id = self._resolve_combo_sub_group_id(line_data, combo_data)
+            resolve_time += time.perf_counter() - resolve_started_at
+            if not product_sub_group_id:
+                # Regular product (not a sub group), keep as is
+                processed_lines.append(line_tuple)
+                continue
+
+            sub_group = combo_data['sub_groups'].get(product_sub_group_id)
+            if not sub_group:
+                _logger.warning(f"Framar Product Groups: Sub group {product_sub_group_id} not found, keeping original line")
+                lines_kept += 1
+                processed_lines.append(self._decode_combo_line(line_tuple, False))
+                continue
+            if not sub_group['components']:
+                _logger.warning(f"Framar Product Groups: Sub group {product_sub_group_id} has no components, keeping original line")
+                lines_kept += 1
+                processed_lines.append(self._decode_combo_line(line_tuple, product_sub_group_id, sub_group))
+                continue
+
+            qty = line_data.get('qty', 1)
+            # Get original price from the sub group line - this is the UNIT price of the sub-group
+            original_price_unit = line_data.get('price_unit', sub_group['price'])
+            sub_group_total_price = original_price_unit * qty  # Total price for this sub group order
+            lines_expanded += 1
+            if debug:
+                _logger.debug(f"Framar Product Groups: Expanding sub group {product_sub_group_id} - qty: {qty}, price_unit: {original_price_unit}, total: {sub_group_total_price}")
+
+            # Expand into components
+            base_line_data = {key: value for key, value in line_data.items() if key not in COMPONENT_LINE_FIELDS_TO_REMOVE}
+            for component in sub_group['components']:
+                component_product_id = component['product_id']
+                if not component_product_id:
+                    _logger.error(f"Framar Product Groups: Component {component['id']} has no product_id!")
+                    continue
+
+                # Calculate component quantity based on sub group quantity
+                component_qty = component['quantity'] * qty
+                component_unit_price = component['list_price']
+                component_share = sub_group['shares'].get(component_product_id)
+                if component_share:
+                    # Proportional distribution: component gets its share based on base value
+                    component_price_portion = component_share * sub_group_total_price
                 else:
-                    # Not a tuple, keep as is (shouldn't happen but be safe)
-                    _logger.warning(f"Framar Product Groups: Line {line_index} is not in expected tuple format, keeping as is")
-                    processed_lines.append(line_tuple)
-            
-            # Now convert component_map to lines, combining duplicates
-            # Each component uses its own unit price and carries its proportional portion of the sub-group price
-            component_items = list(component_map.items())
-            
-            # Process all components - each uses its own unit price
-            total_distributed_price = 0.0
-            for component_product_id, component_info in component_items:
-                component_data = component_info['data'].copy()
-                total_qty = component_info['total_qty']
-                total_price = component_info.get('total_price', 0.0)
-                component_unit_price = component_info.get('component_unit_price', 0.0)
-                
+                    # Fallback: if no base values, use component's own unit price × quantity
+                    component_price_portion = component_unit_price * component_qty
+                    _logger.warning(f"Framar Product Groups: No base value for {component['name']}, using component unit price × qty")
+
+                consumed = consumption.setdefault(
+                    (product_sub_group_id, component_product_id), [sub_group['product_group_id'], 0.0, 0.0])
+                consumed[1] += component_qty
+                consumed[2] += component_price_portion
+
+                existing = component_map.get(component_product_id)
+                if existing:
+                    # Component already exists - combine quantities and prices
+                    existing['total_qty'] += component_qty
+                    existing['total_price'] += component_price_portion
+                    if abs(existing['component_unit_price'] - component_unit_price) > 0.01:
+                        _logger.warning(f"Framar Product Groups: Component {component['name']} has different unit prices: {existing['component_unit_price']} vs {component_unit_price}, keeping first")
+                else:
+                    component_line_data = dict(base_line_data)
+                    component_line_data.update({
+                        'product_id': component_product_id,
+                        'qty': component_qty,
+                        'price_unit': component_unit_price,  # Use component's own unit price
+                        'full_product_name': component['name'],
+                        'is_component': True,
+                        'product_sub_group_name': sub_group['name'],
+                        'product_group_name': sub_group['product_group_name'],
+                    })
+                    component_map[component_product_id] = {
+                        'data': component_line_data,
+                        'total_qty': component_qty,
+                        'total_price': component_price_portion,  # Proportional price for this component
+                        'component_unit_price': component_unit_price,
+                    }
+                if debug:
+                    _logger.debug(f"Framar Product Groups: Component {component['name']} x {component_qty}, unit_price: {component_unit_price}, price_portion: {component_price_portion}")
+
+        merge_started_at = time.perf_counter()
+        # Now convert component_map to lines, combining duplicates
+        # Each component uses its own unit price and carries its proportional portion of the sub-group price
+        for component_info in component_map.values():
+            component_data = component_info['data']
+            total_qty = component_info['total_qty']
+            total_price = component_info['total_price']
+            component_unit_price = component_info['component_unit_price']
+
+            if component_unit_price > 0:
                 # Use the component's own unit price (not calculated from distributed price)
                 # This ensures: unit_price × qty = correct total for each component
-                if component_unit_price > 0:
-                    price_unit = component_unit_price
-                    calculated_total = price_unit * total_qty
-                    
-                    # Verify the calculated total matches the distributed price (with small tolerance for rounding)
-                    price_diff = abs(calculated_total - total_price)
-                    if price_diff > 0.01:
-                        _logger.warning(f"Framar Product Groups: Component {component_data.get('full_product_name')} - price mismatch! unit_price × qty = {calculated_total}, but distributed price = {total_price}. Adjusting distributed price.")
-                        # Use calculated total to ensure consistency
-                        total_price = calculated_total
-                    
-                    _logger.info(f"Framar Product Groups: Component {component_data.get('full_product_name')} - qty: {total_qty}, unit_price: {price_unit}, total: {total_price}")
-                else:
-                    # Fallback: calculate from distributed price if unit price not available
-                    if total_qty > 0 and total_price > 0:
-                        price_unit = total_price / total_qty
-                        _logger.warning(f"Framar Product Groups: Component {component_data.get('full_product_name')} - no unit price, calculating from distributed price: {price_unit}")
-                    else:
-                        price_unit = 0.0
-                        _logger.warning(f"Framar Product Groups: Component {component_data.get('full_product_name')} - no price or quantity")
-                
-                # Calculate subtotal explicitly: price_unit × qty
-                # This ensures each component shows the correct subtotal, not the sub-group's total
-                calculated_subtotal = round(price_unit * total_qty, 2)
-                
-                # Ensure discount is 0 for components to avoid price distortion
-                discount = 0.0
-                
-                # CRITICAL: Explicitly set all price-related fields to ensure correct display
-                component_data.update({
-                    'qty': total_qty,
-                    'price_unit': price_unit,
-                    'discount': discount,  # Force discount to 0
-                    'price_subtotal': calculated_subtotal,  # Explicitly set: unit_price × qty
-                    'price_subtotal_incl': calculated_subtotal,  # Same as subtotal if no tax
-                    'price_total': calculated_subtotal,  # Total price for this component line
-                })
-                
-                processed_lines.append((0, 0, component_data))
-                total_distributed_price += calculated_subtotal
-                _logger.info(f"Framar Product Groups: ✓ Final component line: {component_data.get('full_product_name')} x {total_qty} at unit_price {price_unit} = subtotal {calculated_subtotal}")
-            
-            # Verify total distributed price matches expected
-            _logger.info(f"Framar Product Groups: Total distributed price: {total_distributed_price}")
-            
-            # Update ui_order with processed lines
-            _logger.info(f"Framar Product Groups: Processed {len(processed_lines)} lines (original: {len(ui_order.get('lines', []))}, components: {len(component_map)})")
-            ui_order = ui_order.copy()
-            ui_order['lines'] = processed_lines
-        else:
-            _logger.warning("Framar Product Groups: No lines found in ui_order")
-        
-        return super(PosOrder, self)._order_fields(ui_order)
+                price_unit = component_unit_price
+                if abs(price_unit * total_qty - total_price) > 0.01:
+                    _logger.warning(f"Framar Product Groups: Component {component_data.get('full_product_name')} - price mismatch! unit_price × qty = {price_unit * total_qty}, but distributed price = {total_price}.")
+            elif total_qty > 0 and total_price > 0:
+                # Fallback: calculate from distributed price if unit price not available
+                price_unit = total_price / total_qty
+            else:
+                price_unit = 0.0
+
+            # Calculate subtotal explicitly: price_unit × qty
+            # This ensures each component shows the correct subtotal, not the sub-group's total
+            calculated_subtotal = round(price_unit * total_qty, 2)
+            component_data.update({
+                'qty': total_qty,
+                'price_unit': price_unit,
+                'discount': 0.0,  # Force discount to 0 to avoid price distortion
+                'price_subtotal': calculated_subtotal,
+                'price_subtotal_incl': calculated_subtotal,  # Same as subtotal if no tax
+                'price_total': calculated_subtotal,
+            })
+            processed_lines.append((0, 0, component_data))
+
+        finished_at = time.perf_counter()
+        combo_metrics.get_metrics(self.env.cr.dbname).record(
+            counters={
+                'orders': 1,
+                'lines': len(ui_order['lines']),
+                'lines_expanded': lines_expanded,
+                'lines_kept': lines_kept,
+                'components_produced': len(component_map),
+            },
+            timings={
+                'resolve': resolve_time * 1000,
+                'expand': (merge_started_at - started_at - resolve_time) * 1000,
+                'merge': (finished_at - merge_started_at) * 1000,
+                'order': (finished_at - started_at) * 1000,
+            },
+        )
+        if debug:
+            _logger.debug(f"Framar Product Groups: Processed {len(processed_lines)} lines (original: {len(ui_order['lines'])}, components: {len(component_map)})")
+        ui_order = dict(ui_order, combo_source_lines=ui_order['lines'])
+        ui_order['lines'] = processed_lines
+        ui_order['combo_lines_expanded'] = True
+        ui_order['combo_consumption'] = [
+            (product_group_id, sub_group_id, product_id, qty, revenue)
+            for (sub_group_id, product_id), (product_group_id, qty, revenue) in consumption.items()
+        ]
+        ui_order['combo_expansion_state'] = 'expanded' if lines_expanded else 'none'
+        return ui_order
 
 
 class PosOrderLine(models.Model):
@@ -322,8 +697,22 @@ class PosOrderLine(models.Model):
 
     product_group_name = fields.Char(string='Big Group Name', help='Name of the big product group (e.g., Kikomando)')
     product_sub_group_name = fields.Char(string='Sub Group Name', help='Name of the sub group for receipt display (e.g., Kikomando 1500)')
-    product_sub_group_id = fields.Many2one('product.group.sub', string='Product Sub Group', help='Sub group that this line represents (for expansion into components)')
+    product_sub_group_id = fields.Many2one('product.group.sub', string='Product Sub Group', index='btree_not_null', help='Sub group that this line represents (for expansion into components)')
     is_component = fields.Boolean(string='Is Component', default=False, help='True if this line is a component of a product sub group')
+
+    def _get_combo_line_data(self):
+        """Return the line in the UI format read by ``pos.order._expand_combo_lines``"""
+        self.ensure_one()
+        return {
+            'product_id': self.product_id.id,
+            'qty': self.qty,
+            'price_unit': self.price_unit,
+            'discount': self.discount,
+            'tax_ids': [Command.set(self.tax_ids.ids)],
+            'full_product_name': self.full_product_name,
+            'customer_note': self.customer_note,
+            'product_sub_group_id': self.product_sub_group_id.id,
+        }
     
     def _is_field_accepted(self, field):
         """Override to allow product_sub_group_id and related fields through"""
@@ -1,11 +1,95 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, api
+import time
+from collections import defaultdict
+
+from odoo import models, fields, api
+import logging
+
+from . import combo_metrics
+from . import combo_recipe
+
+_logger = logging.getLogger(__name__)
 
 
 class PosSession(models.Model):
     _inherit = 'pos.session'
 
+    def _validate_session(self, *args, **kwargs):
+        """Expand the pending combo orders, and retry the failed ones, before the session
+        is closed, so that its accounting and stock moves are built from the component lines"""
+        pending_orders = self.order_ids.filtered(lambda order: order.combo_expansion_state in ('pending', 'failed'))
+        if pending_orders:
+            pending_orders._expand_pending_combo_lines()
+        self._consolidate_combo_component_moves()
+        return super(PosSession, self)._validate_session(*args, **kwargs)
+
+    def _consolidate_combo_component_moves(self):
+        """Move the stock of the component lines left out of the order pickings.
+
+        The lines of the whole session are grouped by destination, like
+        ``_create_picking_at_end_of_session`` does, and given to
+        ``stock.picking._create_picking_from_pos_order_lines``, which makes one
+        move per product (with its move lines per lot). The order behind each
+        quantity is kept in ``pos.combo.move.trace``.
+        """
+        Line = self.env['pos.order.line']
+        Picking = self.env['stock.picking']
+        for session in self:
+            orders = session.order_ids.filtered('combo_component_moves_deferred')
+            if not orders:
+                continue
+            started_at = time.perf_counter()
+            picking_type = session.config_id.picking_type_id
+            if not picking_type or not picking_type.default_location_dest_id:
+                session_destination_id = self.env['stock.warehouse']._get_partner_locations()[0].id
+            else:
+                session_destination_id = picking_type.default_location_dest_id.id
+            lines_by_destination = defaultdict(lambda: Line)
+            for order in orders:
+                destination_id = order.partner_id.property_stock_customer.id or session_destination_id
+                lines_by_destination[destination_id] |= order.lines.filtered('is_component')
+
+            traces = []
+            pickings = Picking
+            for destination_id, lines in lines_by_destination.items():
+                destination_pickings = Picking._create_picking_from_pos_order_lines(destination_id, lines, picking_type)
+                destination_pickings.write({'pos_session_id': session.id, 'origin': session.name})
+                pickings |= destination_pickings
+                # Returns come back from the destination, sales go to it
+                moves = {
+                    (move.product_id.id, move.location_dest_id.id != destination_id): move.id
+                    for move in destination_pickings.move_ids
+                }
+                quantities = defaultdict(float)
+                for line in lines:
+                    quantities[line.order_id.id, line.product_id.id, line.qty < 0] += line.qty
+                traces += [
+                    (session.id, order_id, product_id, qty, moves.get((product_id, is_return)))
+                    for (order_id, product_id, is_return), qty in quantities.items()
+                ]
+            self.env['pos.combo.move.trace'].sudo()._add_traces(traces)
+            orders.combo_component_moves_deferred = False
+
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            line_count = sum(len(lines) for lines in lines_by_destination.values())
+            move_count = len(pickings.move_ids)
+            move_line_count = len(pickings.move_line_ids)
+            combo_metrics.get_metrics(self.env.cr.dbname).record(
+                counters={
+                    'consolidated_sessions': 1,
+                    'consolidated_component_lines': line_count,
+                    'consolidated_moves': move_count,
+                    'consolidated_move_lines': move_line_count,
+                },
+                timings={'session_consolidation': elapsed_ms},
+            )
+            _logger.info(
+                "Framar Product Groups: Session %s: %s component lines of %s orders consolidated into "
+                "%s stock moves (%s move lines) in %.1f ms",
+                session.name, line_count, len(orders), move_count, move_line_count, elapsed_ms,
+            )
+
     def _loader_params_product_product(self):
         """Add product group and sub group fields to product loading, and exclude sub groups from POS"""
         params = super(PosSession, self)._loader_params_product_product()
@@ -36,3 +120,56 @@ class PosSession(models.Model):
         
         return params
 
+    def _pos_ui_models_to_load(self):
+        """Load the whole product group tree with the session data"""
+        result = super(PosSession, self)._pos_ui_models_to_load()
+        if 'product.group' not in result:
+            result.append('product.group')
+        return result
+
+    def _pos_data_process(self, loaded_data):
+        """Add the catalog tokens used by the POS to request catalog deltas"""
+        super(PosSession, self)._pos_data_process(loaded_data)
+        loaded_data['product_group_catalog'] = {
+            'version': combo_recipe.get_catalog_version(self.env.cr),
+            'since': fields.Datetime.to_string(fields.Datetime.now()),
+        }
+
+    def _loader_params_product_group(self):
+        return {
+            'search_params': {
+                'domain': [('active', '=', True)],
+                'fields': ['name'],
+            },
+        }
+
+    def _get_pos_ui_product_group(self, params):
+        """Return the active big groups with their active sub groups nested.
+
+        Two queries whatever the size of the catalog, instead of one RPC per
+        group and per sub group from the POS. Only what the cashier UI shows is
+        loaded: components are expanded server side and fetched on demand (see
+        ``product.group.sub.get_pos_combo_components``). Registers that keep
+        the catalog on the device only get the catalog tokens and fetch the
+        changes.
+        """
+        if self.config_id.product_group_catalog_cache:
+            return []
+        groups = self.env['product.group'].search_read(**params['search_params'])
+        sub_groups = self.env['product.group.sub'].search_read(
+            [('product_group_id', 'in', [group['id'] for group in groups])],
+            ['name', 'price', 'sequence', 'product_group_id'],
+        )
+
+        groups_by_id = {group['id']: group for group in groups}
+        for group in groups:
+            group['sub_groups'] = []
+        for sub_group in sub_groups:
+            group = groups_by_id[sub_group['product_group_id'][0]]
+            # Add parent group info to each sub group for easy access
+            sub_group['product_group_id'] = group['id']
+            sub_group['product_group_name'] = group['name']
+            group['sub_groups'].append(sub_group)
+        for group in groups:
+            group['sub_groups'].sort(key=lambda sub_group: sub_group['sequence'] or 10)
+        return groups
@@ -1,10 +1,36 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import float_round
 import logging
 
+from . import combo_recipe
+
 _logger = logging.getLogger(__name__)
 
+# Changes committed by transactions that started before the previous delta
+# call carry an older write_date: re-read that window on every call
+CATALOG_DELTA_OVERLAP = timedelta(minutes=5)
+
+# Sub group fields that are part of its compiled recipe
+RECIPE_FIELDS = {'name', 'price', 'active', 'product_group_id', 'component_ids'}
+# Sub group fields the POS order price fallback index depends on
+PRICE_INDEX_FIELDS = {'price', 'active', 'product_group_id'}
+# Sub group fields mirrored on their product template
+TEMPLATE_FIELDS = {'name', 'price'}
+
+
+def _import_number(value, cast, default):
+    """Return ``cast(value)``, or ``default`` when the cell is empty (``0`` is a value)"""
+    if value is None or not value.strip():
+        return default
+    return cast(value)
+
 
 class ProductGroup(models.Model):
     """Big Group - Main collection (e.g., Kikomando, Rolex)"""
@@ -31,45 +57,45 @@ class ProductGroup(models.Model):
         help='Product template for this big group (shown in POS)'
     )
 
-    @api.model
-    def create(self, vals):
-        """Create a product template when creating a big group"""
-        res = super(ProductGroup, self).create(vals)
-        # Create a product template for this big group
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Create the product templates of the new big groups in one batch"""
+        records = super(ProductGroup, self).create(vals_list)
+        combo_recipe.touch_catalog(self.env.cr)
+        combo_recipe.invalidate_price_index(self.env.cr)
         try:
-            # Build product template values
-            template_vals = {
-                'name': vals.get('name'),
+            # Don't set pos_categ_ids - let Odoo handle it automatically or set it manually later
+            # This avoids foreign key constraint issues during creation
+            templates = self.env['product.template'].create([{
+                'name': record.name,
                 'type': 'product',
                 'available_in_pos': True,
                 'sale_ok': True,
                 'purchase_ok': False,
                 'is_product_group': True,
-                'product_group_id': res.id,
+                'product_group_id': record.id,
                 'list_price': 0.0,  # Price will be set by sub groups
-            }
-            
-            # Don't set pos_categ_ids - let Odoo handle it automatically or set it manually later
-            # This avoids foreign key constraint issues during creation
-            
-            product_template = self.env['product.template'].create(template_vals)
-            res.product_template_id = product_template.id
-            
-            # Ensure the product variant also has the fields
-            for product_variant in product_template.product_variant_ids:
-                product_variant.is_product_group = True
-                product_variant.product_group_id = res.id
+            } for record in records])
+            # One UPDATE for the whole batch rather than one write per group
+            self.env.cr.execute(f"""
+                UPDATE {self._table} AS product_group
+                   SET product_template_id = data.template_id::int
+                  FROM (VALUES {", ".join(["%s"] * len(records))}) AS data(id, template_id)
+                 WHERE product_group.id = data.id::int
+            """, [(record.id, template.id) for record, template in zip(records, templates)])
+            records.invalidate_recordset(['product_template_id'])
         except Exception as e:
             # Log error but don't fail the creation
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.warning(f"Error creating product template for product group {res.id}: {e}")
-        
-        return res
+            _logger.warning(f"Error creating product templates for product groups {records.ids}: {e}")
+        return records
 
     def write(self, vals):
         """Update product template when product group is updated"""
         res = super(ProductGroup, self).write(vals)
+        combo_recipe.touch_catalog(self.env.cr)
+        if 'name' in vals:
+            # The group name is part of the compiled recipes of its sub groups
+            self.env['product.group.sub']._invalidate_combo_recipes(self.with_context(active_test=False).sub_group_ids.ids)
         if 'name' in vals and self.product_template_id and self.product_template_id.exists():
             try:
                 # Update name safely
@@ -82,21 +108,185 @@ class ProductGroup(models.Model):
 
     def unlink(self):
         """Clean up product template and its relationships before deletion"""
-        # Store product template IDs before deletion
-        template_ids = self.mapped('product_template_id').ids
-        
-        # Remove POS category relationships first to avoid foreign key constraint
-        for template in self.mapped('product_template_id'):
-            if template.exists():
-                # Clear pos_categ_ids to remove the relationship
-                template.write({'pos_categ_ids': [(5, 0, 0)]})
-        
-        # Delete the product templates
-        templates = self.env['product.template'].browse(template_ids)
-        templates.filtered(lambda t: t.exists()).unlink()
-        
+        # Sub groups are deleted in cascade, drop their compiled recipes
+        self.env['product.group.sub']._invalidate_combo_recipes(self.with_context(active_test=False).sub_group_ids.ids)
+        combo_recipe.invalidate_price_index(self.env.cr)
+        combo_recipe.touch_catalog(self.env.cr)
+
+        # Remove POS category relationships first to avoid foreign key constraint,
+        # then delete the product templates: one write and one unlink for the whole set
+        templates = self.product_template_id.exists()
+        if templates:
+            templates.write({'pos_categ_ids': [(5, 0, 0)]})
+            templates.unlink()
+
         return super(ProductGroup, self).unlink()
 
+    @api.model
+    def _import_catalog_rows(self, rows, chunk_size=500, commit=False):
+        """Import groups, sub groups and components from flat rows.
+
+        Each row is a dict with ``group``, ``sub_group``, ``price`` and
+        optionally ``sequence``, ``component`` (internal reference or name of
+        the component product) and ``quantity``; a sub group has one row per
+        component. Everything is validated in memory first and nothing is
+        written if a row is invalid. Groups and sub groups are matched by name,
+        the components of imported sub groups are replaced. Records are then
+        created in batches of ``chunk_size`` groups, committed after each
+        batch when ``commit`` is set.
+
+        :return: dict of counters and the elapsed time in seconds
+        """
+        started_at = time.monotonic()
+        errors = []
+        catalog = {}  # {group_name: {sub_group_name: {'price', 'sequence', 'components'}}}
+        for index, row in enumerate(rows, start=1):
+            # JSON cells may be numbers, booleans or null: parse them all as CSV text
+            row = {key: str(value) if value is not None else '' for key, value in row.items()}
+            group_name = (row.get('group') or '').strip()
+            sub_group_name = (row.get('sub_group') or '').strip()
+            if not group_name or not sub_group_name:
+                errors.append(_('Row %(row)s: group and sub group are required', row=index))
+                continue
+            try:
+                price = _import_number(row.get('price'), float, 0.0)
+                sequence = _import_number(row.get('sequence'), int, 10)
+                quantity = _import_number(row.get('quantity'), float, 1.0)
+            except (TypeError, ValueError):
+                errors.append(_('Row %(row)s: price, sequence and quantity must be numbers', row=index))
+                continue
+            sub_group = catalog.setdefault(group_name, {}).setdefault(
+                sub_group_name, {'price': price, 'sequence': sequence, 'components': []})
+            if sub_group['price'] != price:
+                errors.append(_('Row %(row)s: sub group "%(name)s" has several prices', row=index, name=sub_group_name))
+            component = (row.get('component') or '').strip()
+            if component:
+                if quantity <= 0:
+                    errors.append(_('Row %(row)s: component quantity must be greater than 0', row=index))
+                sub_group['components'].append((index, component, quantity))
+
+        # Resolve component products by internal reference, then by name
+        product_keys = {
+            component for sub_groups in catalog.values() for sub_group in sub_groups.values()
+            for _index, component, _quantity in sub_group['components']
+        }
+        Product = self.env['product.product']
+        product_by_key = {}
+        if product_keys:
+            for product in Product.search_fetch([('default_code', 'in', list(product_keys))], ['default_code']):
+                product_by_key.setdefault(product.default_code, product.id)
+            missing_keys = product_keys - set(product_by_key)
+            if missing_keys:
+                for product in Product.search_fetch([('name', 'in', list(missing_keys))], ['name']):
+                    product_by_key.setdefault(product.name, product.id)
+        for sub_groups in catalog.values():
+            for sub_group in sub_groups.values():
+                for index, component, _quantity in sub_group['components']:
+                    if component not in product_by_key:
+                        errors.append(_('Row %(row)s: unknown component product "%(product)s"', row=index, product=component))
+        if errors:
+            raise UserError(_('The import contains errors, nothing was imported:\n%s', '\n'.join(errors[:20])))
+
+        stats = {'rows': len(rows), 'groups_created': 0, 'sub_groups_created': 0,
+                 'sub_groups_updated': 0, 'components_created': 0}
+        SubGroup = self.env['product.group.sub'].with_context(active_test=False)
+        Component = self.env['product.group.component']
+        group_names = list(catalog)
+        for start in range(0, len(group_names), chunk_size):
+            chunk = group_names[start:start + chunk_size]
+            groups = self.with_context(active_test=False).search_fetch([('name', 'in', chunk)], ['name'])
+            group_by_name = {group.name: group for group in groups}
+            new_groups = self.create([{'name': name} for name in chunk if name not in group_by_name])
+            group_by_name.update({group.name: group for group in new_groups})
+            stats['groups_created'] += len(new_groups)
+
+            existing_sub_groups = SubGroup.search_fetch(
+                [('product_group_id', 'in', [group.id for group in group_by_name.values()])],
+                ['name', 'price', 'sequence', 'product_group_id'])
+            sub_group_by_key = {(sub.product_group_id.id, sub.name): sub for sub in existing_sub_groups}
+            to_create = []
+            for group_name in chunk:
+                group = group_by_name[group_name]
+                for name, values in catalog[group_name].items():
+                    sub_group = sub_group_by_key.get((group.id, name))
+                    if not sub_group:
+                        to_create.append({'product_group_id': group.id, 'name': name,
+                                          'price': values['price'], 'sequence': values['sequence']})
+                    elif (sub_group.price, sub_group.sequence) != (values['price'], values['sequence']):
+                        sub_group.write({'price': values['price'], 'sequence': values['sequence']})
+                        stats['sub_groups_updated'] += 1
+            new_sub_groups = SubGroup.create(to_create)
+            sub_group_by_key.update({(sub.product_group_id.id, sub.name): sub for sub in new_sub_groups})
+            stats['sub_groups_created'] += len(new_sub_groups)
+
+            imported_sub_groups = SubGroup.browse([
+                sub_group_by_key[(group_by_name[group_name].id, name)].id
+                for group_name in chunk for name in catalog[group_name]
+            ])
+            Component.search([('sub_group_id', 'in', imported_sub_groups.ids)]).unlink()
+            components = Component.create([
+                {
+                    'sub_group_id': sub_group_by_key[(group_by_name[group_name].id, name)].id,
+                    'product_id': product_by_key[component],
+                    'quantity': quantity,
+                    'sequence': sequence,
+                }
+                for group_name in chunk
+                for name, values in catalog[group_name].items()
+                for sequence, (_index, component, quantity) in enumerate(values['components'], start=1)
+            ])
+            stats['components_created'] += len(components)
+            if commit:
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+            _logger.info(f"Product group import: {min(start + chunk_size, len(group_names))}/{len(group_names)} groups")
+
+        stats['elapsed'] = round(time.monotonic() - started_at, 3)
+        _logger.info(f"Product group import done: {stats}")
+        return stats
+
+    @api.model
+    def get_pos_catalog_delta(self, since=None, version=None):
+        """Return the POS catalog changes since a previous call.
+
+        ``since`` and ``version`` are the tokens returned by the previous call
+        (or delivered with the session data). Changed groups and sub groups are
+        returned with their ``active`` flag so registers can drop deactivated
+        ones, together with the ids of everything still alive to detect
+        deletions. When ``version`` is still the current
+        catalog version nothing has changed and only the tokens are returned.
+        """
+        current_version = combo_recipe.get_catalog_version(self.env.cr)
+        now = fields.Datetime.now()
+        delta = {
+            'version': current_version,
+            'since': fields.Datetime.to_string(now),
+            'unchanged': bool(version) and version == current_version,
+        }
+        if delta['unchanged']:
+            return delta
+
+        group_domain = sub_group_domain = []
+        if since:
+            changed_since = fields.Datetime.to_datetime(since) - CATALOG_DELTA_OVERLAP
+            changed_group_ids = self.with_context(active_test=False).search([('write_date', '>=', changed_since)]).ids
+            changed_sub_group_ids = self.env['product.group.sub'].with_context(active_test=False).search([
+                '|', ('write_date', '>=', changed_since), ('product_group_id', 'in', changed_group_ids),
+            ]).ids
+            # A (re)activated parent brings back its whole subtree
+            group_domain = [('id', 'in', changed_group_ids)]
+            sub_group_domain = [('id', 'in', changed_sub_group_ids)]
+        Group = self.with_context(active_test=False)
+        SubGroup = self.env['product.group.sub'].with_context(active_test=False)
+        delta.update({
+            'groups': Group.search_read(group_domain, ['name', 'active']),
+            'sub_groups': SubGroup.search_read(sub_group_domain, [
+                'name', 'price', 'sequence', 'active', 'product_group_id',
+            ]),
+            'group_ids': self.search([]).ids,
+            'sub_group_ids': self.env['product.group.sub'].search([('product_group_id.active', '=', True)]).ids,
+        })
+        return delta
+
 
 class ProductGroupSub(models.Model):
     """Sub Group - Specific variant with price (e.g., Kikomando 1500, Kikomando 3000)"""
@@ -104,21 +294,54 @@ class ProductGroupSub(models.Model):
     _description = 'Product Sub Group'
     _order = 'sequence, price'
     
+    @api.model
+    def _get_pos_visible_sub_group_templates_domain(self):
+        return [('is_product_sub_group', '=', True), ('available_in_pos', '=', True)]
+
     @api.model
     def _hide_all_sub_groups_from_pos(self):
-        """Hide all existing sub group products from POS (called on module upgrade)"""
-        sub_groups = self.search([])
-        for sub_group in sub_groups:
-            if sub_group.product_template_id and sub_group.product_template_id.exists():
-                if sub_group.product_template_id.available_in_pos:
-                    try:
-                        sub_group.product_template_id.write({'available_in_pos': False})
-                        _logger.info(f"Hidden sub group product '{sub_group.product_template_id.name}' from POS")
-                    except Exception as e:
-                        _logger.warning(f"Error hiding sub group product '{sub_group.product_template_id.name}' from POS: {e}")
+        """Hide all existing sub group products from POS, in one write (see the 17.0.1.1.0 migration)"""
+        templates = self.env['product.template'].with_context(active_test=False).search(
+            self._get_pos_visible_sub_group_templates_domain())
+        if templates:
+            templates.write({'available_in_pos': False})
+            _logger.info(f"Hidden {len(templates)} sub group products from POS")
+        return len(templates)
+
+    @api.model
+    def _cron_hide_sub_groups_from_pos(self, batch_size=1000):
+        """Hide sub group products from POS by chunks of ``batch_size``, committing each chunk.
+
+        Keeps locks short on large catalogs; progress is reported in the server log.
+        """
+        Template = self.env['product.template'].with_context(active_test=False)
+        domain = self._get_pos_visible_sub_group_templates_domain()
+        total = Template.search_count(domain)
+        done = 0
+        while done < total:
+            templates = Template.search(domain, limit=batch_size)
+            if not templates:
+                break
+            templates.write({'available_in_pos': False})
+            done += len(templates)
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+            _logger.info(f"Hidden sub group products from POS: {done}/{total}")
+        return done
+
+    def action_hide_sub_groups_from_pos(self):
+        """Hide the sub group products still shown in POS now, by chunks"""
+        done = self._cron_hide_sub_groups_from_pos()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'info',
+                'message': f'{done} sub group products hidden from POS.',
+            },
+        }
 
     name = fields.Char(string='Sub Group Name', required=True, help='e.g., Kikomando 1500, Kikomando 3000')
-    product_group_id = fields.Many2one('product.group', string='Big Group', required=True, ondelete='cascade')
+    product_group_id = fields.Many2one('product.group', string='Big Group', required=True, ondelete='cascade', index=True)
     price = fields.Float(string='Price', required=True, digits='Product Price', help='Selling price for this sub group')
     active = fields.Boolean(string='Active', default=True)
     sequence = fields.Integer(string='Sequence', default=10, help='Order of display in POS')
@@ -138,107 +361,304 @@ class ProductGroupSub(models.Model):
         help='Product template for this sub group'
     )
 
-    @api.model
-    def create(self, vals):
-        """Create a product template when creating a sub group"""
-        res = super(ProductGroupSub, self).create(vals)
-        # Create a product template for this sub group
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Create the product templates of the new sub groups in one batch"""
+        records = super(ProductGroupSub, self).create(vals_list)
+        combo_recipe.touch_catalog(self.env.cr)
+        combo_recipe.invalidate_price_index(self.env.cr)
         try:
-            # Check if product_template_id was already set (shouldn't happen, but be safe)
-            if res.product_template_id and res.product_template_id.exists():
-                # Template already exists, just update it
-                template_vals = {}
-                if 'name' in vals:
-                    template_vals['name'] = vals.get('name')
-                if 'price' in vals:
-                    template_vals['list_price'] = vals.get('price', 0.0)
-                if template_vals:
-                    res.product_template_id.sudo().write(template_vals)
-            else:
-                # Build product template values
-                # NOTE: Sub groups should NOT appear in POS - they're only for selection in popup
-                template_vals = {
-                    'name': vals.get('name'),
-                    'type': 'product',
-                    'available_in_pos': False,  # Hide sub groups from POS - only show in popup
-                    'sale_ok': True,
-                    'purchase_ok': False,
-                    'is_product_sub_group': True,
-                    'product_sub_group_id': res.id,
-                    'list_price': vals.get('price', 0.0),
-                }
-                
-                # Don't set pos_categ_ids - let Odoo handle it automatically or set it manually later
-                # This avoids foreign key constraint issues during creation
-                
-                product_template = self.env['product.template'].create(template_vals)
-                res.product_template_id = product_template.id
-                
-                # Ensure the product variant also has the fields
-                for product_variant in product_template.product_variant_ids:
-                    product_variant.is_product_sub_group = True
-                    product_variant.product_sub_group_id = res.id
+            # A product_template_id given at creation (shouldn't happen, but be safe) is only updated
+            linked = records.filtered(lambda record: record.product_template_id)
+            for record in linked:
+                record.product_template_id.sudo().write({'name': record.name, 'list_price': record.price})
+
+            # NOTE: Sub groups should NOT appear in POS - they're only for selection in popup
+            to_link = records - linked
+            templates = self.env['product.template'].create([{
+                'name': record.name,
+                'type': 'product',
+                'available_in_pos': False,  # Hide sub groups from POS - only show in popup
+                'sale_ok': True,
+                'purchase_ok': False,
+                'is_product_sub_group': True,
+                'product_sub_group_id': record.id,
+                'list_price': record.price,
+            } for record in to_link])
+            for record, template in zip(to_link, templates):
+                super(ProductGroupSub, record).write({'product_template_id': template.id})
         except Exception as e:
             # Log error but don't fail the creation
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.warning(f"Error creating product template for sub group {res.id}: {e}")
-        
-        return res
+            _logger.warning(f"Error creating product templates for sub groups {records.ids}: {e}")
+        return records
 
     def write(self, vals):
         """Update product template when sub group is updated"""
         res = super(ProductGroupSub, self).write(vals)
-        if self.product_template_id and self.product_template_id.exists():
+        combo_recipe.touch_catalog(self.env.cr)
+        if RECIPE_FIELDS.intersection(vals):
+            self._invalidate_combo_recipes(self.ids)
+        if PRICE_INDEX_FIELDS.intersection(vals):
+            combo_recipe.invalidate_price_index(self.env.cr)
+        if TEMPLATE_FIELDS.intersection(vals):
+            self._sync_product_templates()
+        return res
+
+    def _sync_product_templates(self):
+        """Align the product templates of ``self`` on their sub group, set-wise.
+
+        Only the templates whose name or price actually differ, or that are
+        visible in POS (sub groups are only shown in the popup), are written,
+        with one write per distinct set of values.
+        """
+        templates_by_values = defaultdict(lambda: self.env['product.template'])
+        for record in self.sudo():
+            template = record.product_template_id
+            if not template:
+                continue
+            update_vals = {}
+            if template.name != record.name:
+                update_vals['name'] = record.name
+            if template.currency_id.compare_amounts(template.list_price, record.price):
+                update_vals['list_price'] = record.price
+            if template.available_in_pos:
+                update_vals['available_in_pos'] = False
+            if update_vals:
+                templates_by_values[tuple(sorted(update_vals.items()))] |= template
+        for values, templates in templates_by_values.items():
             try:
-                # Before updating, clear any problematic pos_categ_ids relationships
-                # This prevents foreign key constraint errors
-                template = self.product_template_id.sudo()
-                if template.pos_categ_ids:
-                    try:
-                        # Clear pos_categ_ids to avoid constraint issues
-                        template.write({'pos_categ_ids': [(5, 0, 0)]})
-                    except Exception:
-                        # If clearing fails, continue anyway
-                        pass
-                
-                update_vals = {}
-                if 'name' in vals:
-                    update_vals['name'] = vals['name']
-                if 'price' in vals:
-                    # Use list_price (list price) - correct field name
-                    # Check if field exists before writing
-                    if 'list_price' in template._fields:
-                        update_vals['list_price'] = vals['price']
-                # Ensure sub groups are always hidden from POS (they should only appear in popup)
-                if template.available_in_pos:
-                    update_vals['available_in_pos'] = False
-                if update_vals:
-                    # Use sudo() to avoid permission issues and write safely
-                    template.write(update_vals)
+                templates.write(dict(values))
             except Exception as e:
-                # If there's an error with the product template, log it but continue
-                _logger.warning(f"Error updating product template for sub group {self.id}: {e}")
-                # Don't try to recreate - just log the error and continue
-        return res
+                # If there's an error with the product templates, log it but continue
+                _logger.warning(f"Error updating product templates {templates.ids} of sub groups: {e}")
 
     def unlink(self):
         """Clean up product template and its relationships before deletion"""
-        # Store product template IDs before deletion
-        template_ids = self.mapped('product_template_id').ids
-        
-        # Remove POS category relationships first to avoid foreign key constraint
-        for template in self.mapped('product_template_id'):
-            if template.exists():
-                # Clear pos_categ_ids to remove the relationship
-                template.write({'pos_categ_ids': [(5, 0, 0)]})
-        
-        # Delete the product templates
-        templates = self.env['product.template'].browse(template_ids)
-        templates.filtered(lambda t: t.exists()).unlink()
-        
+        # Nested sub groups are restricted: refuse before touching their templates
+        parents = self.env['product.group.component'].sudo().search([
+            ('child_sub_group_id', 'in', self.ids), ('sub_group_id', 'not in', self.ids),
+        ]).sub_group_id
+        if parents:
+            raise UserError(_(
+                'These sub groups are components of other sub groups and cannot be deleted: %(children)s.\n'
+                'Remove them from the recipes of %(parents)s first.',
+                children=', '.join(self.filtered(lambda sub_group: sub_group in parents.component_ids.child_sub_group_id).mapped('name')),
+                parents=', '.join(parents.mapped('name')),
+            ))
+        self._invalidate_combo_recipes(self.ids)
+        combo_recipe.invalidate_price_index(self.env.cr)
+        combo_recipe.touch_catalog(self.env.cr)
+
+        # Remove POS category relationships first to avoid foreign key constraint,
+        # then delete the product templates: one write and one unlink for the whole set
+        templates = self.product_template_id.exists()
+        if templates:
+            templates.write({'pos_categ_ids': [(5, 0, 0)]})
+            templates.unlink()
+
         return super(ProductGroupSub, self).unlink()
 
+    def init(self):
+        combo_recipe.init_version_table(self.env.cr)
+        # The POS order fallback resolves sub groups from the in-memory price
+        # index, loaded with one full read: the price lookup index of earlier
+        # versions is never used
+        self.env.cr.execute("DROP INDEX IF EXISTS product_group_sub_group_price_active_index")
+
+    @api.model
+    def _invalidate_combo_recipes(self, sub_group_ids):
+        """Drop the recipes of ``sub_group_ids`` and of the sub groups nesting them"""
+        sub_group_ids = set(sub_group_ids)
+        if not sub_group_ids:
+            return
+        self.env['product.group.component'].flush_model(['sub_group_id', 'child_sub_group_id'])
+        self.env.cr.execute("""
+            WITH RECURSIVE ancestors(id) AS (
+                SELECT sub_group_id FROM product_group_component WHERE child_sub_group_id = ANY(%s)
+                UNION
+                SELECT c.sub_group_id FROM product_group_component c JOIN ancestors a ON c.child_sub_group_id = a.id
+            )
+            SELECT id FROM ancestors
+        """, [list(sub_group_ids)])
+        sub_group_ids.update(row[0] for row in self.env.cr.fetchall())
+        combo_recipe.invalidate(self.env.cr, sub_group_ids)
+
+    @api.model
+    def _get_combo_recipes(self, sub_group_ids, version=None):
+        """Return ``{sub_group_id: recipe}`` for the existing sub groups among ``sub_group_ids``.
+
+        Recipes come from the per-registry cache when they were compiled at the
+        current catalog version (read unless given as ``version``); the missing
+        ones are compiled together in a constant number of queries.
+        """
+        cr = self.env.cr
+        cache = combo_recipe.get_cache(cr.dbname)
+        if version is None:
+            version = combo_recipe.get_version(cr)
+        recipes = {}
+        missing_ids = []
+        for sub_group_id in set(sub_group_ids):
+            recipe = cache.get(sub_group_id, version)
+            if recipe is None:
+                missing_ids.append(sub_group_id)
+            else:
+                recipes[sub_group_id] = recipe
+        if missing_ids:
+            # Never share recipes compiled from changes that are not committed yet
+            pending_ids = combo_recipe.pending_invalidations(cr)
+            for recipe in self._compile_combo_recipes(missing_ids):
+                recipes[recipe['id']] = recipe
+                if recipe['id'] not in pending_ids:
+                    cache.set(recipe, version)
+        return recipes
+
+    @api.model
+    def _compile_combo_recipes(self, sub_group_ids):
+        """Compile the recipes of ``sub_group_ids`` (archived ones included).
+
+        Components nesting another sub group are flattened into the leaf
+        products of its recipe, itself taken from ``_get_combo_recipes`` so
+        that nested sub groups are compiled once and shared by all the combos
+        using them: whatever the depth, a recipe is a flat list of products.
+
+        The base value of a product component is its ``list_price × quantity``
+        and the one of a nested sub group its ``price × quantity``; the share
+        of a base value in the sub group total is split between the products
+        of a nested sub group along its own shares. Expanding a line is then
+        a multiplication of the line total by the share of each product.
+        """
+        sub_groups = self.sudo().with_context(active_test=False).search_fetch(
+            [('id', 'in', list(sub_group_ids))], ['name', 'price', 'active', 'product_group_id'])
+        sub_groups.product_group_id.fetch(['name'])
+        components = self.env['product.group.component'].sudo().search_fetch(
+            [('sub_group_id', 'in', sub_groups.ids)], ['sub_group_id', 'product_id', 'child_sub_group_id', 'quantity'],
+            order='sequence, id')
+        components.product_id.product_tmpl_id.fetch(['name', 'list_price'])
+        components_by_sub_group = {sub_group.id: [] for sub_group in sub_groups}
+        for component in components:
+            components_by_sub_group[component.sub_group_id.id].append(component)
+        nested_recipes = {}
+        child_ids = set(components.child_sub_group_id.ids)
+        if child_ids:
+            nested_recipes = self._get_combo_recipes(child_ids)
+
+        recipes = []
+        for sub_group in sub_groups:
+            leaves = {}  # {product_id: component dict}, merged by product
+            base_values = {}  # {product_id: share of the sub group base value}
+            total_base_value = 0.0
+            parts = []  # (base value, {product_id: share of the part})
+            for component in components_by_sub_group[sub_group.id]:
+                nested = nested_recipes.get(component.child_sub_group_id.id)
+                if nested:
+                    for leaf in nested['components']:
+                        self._add_combo_leaf(leaves, leaf, component.id, leaf['quantity'] * component.quantity)
+                    base_value = (nested['price'] or nested['total_base_value']) * component.quantity
+                    parts.append((base_value, nested['shares']))
+                elif component.product_id:
+                    product = component.product_id
+                    leaf = {'product_id': product.id, 'name': product.name, 'list_price': product.list_price or 0.0}
+                    self._add_combo_leaf(leaves, leaf, component.id, component.quantity)
+                    base_value = (product.list_price or 0.0) * component.quantity
+                    parts.append((base_value, {product.id: 1.0}))
+                else:
+                    continue
+                total_base_value += base_value
+
+            shares = {}
+            if total_base_value > 0:
+                for base_value, part_shares in parts:
+                    for product_id, part_share in part_shares.items():
+                        share = base_value / total_base_value * part_share
+                        if share > 0:
+                            shares[product_id] = shares.get(product_id, 0.0) + share
+                base_values = {product_id: share * total_base_value for product_id, share in shares.items()}
+            recipes.append({
+                'id': sub_group.id,
+                'name': sub_group.name,
+                'price': sub_group.price,
+                'active': sub_group.active,
+                'product_group_id': sub_group.product_group_id.id,
+                'product_group_name': sub_group.product_group_id.name or '',
+                'components': list(leaves.values()),
+                'component_base_values': base_values,
+                'total_base_value': total_base_value,
+                'shares': shares,
+            })
+        return recipes
+
+    @api.model
+    def _add_combo_leaf(self, leaves, leaf, component_id, quantity):
+        """Add ``quantity`` of the product of ``leaf`` to the flattened components ``leaves``"""
+        existing = leaves.get(leaf['product_id'])
+        if existing:
+            existing['quantity'] += quantity
+        else:
+            leaves[leaf['product_id']] = {
+                'id': component_id,
+                'product_id': leaf['product_id'],
+                'name': leaf['name'],
+                'list_price': leaf['list_price'],
+                'quantity': quantity,
+            }
+
+    @api.model
+    def _get_combo_price_index(self, version, digits):
+        """Return the price index of the POS order fallback at catalog ``version``.
+
+        ``{'product_groups': {product_id: group_id}, 'sub_groups': {(group_id,
+        price): [sub_group_ids]}, 'ambiguous': {...}}`` with the prices rounded
+        to ``digits`` decimals. Built in two
+        queries when missing from the worker cache; ``ambiguous`` holds the
+        prices shared by several active sub groups of the same group.
+        """
+        cache = combo_recipe.get_cache(self.env.cr.dbname)
+        index = cache.get_price_index(version, digits)
+        if index is not None:
+            return index
+        products = self.env['product.product'].sudo().with_context(active_test=False).search_fetch(
+            [('is_product_group', '=', True), ('product_group_id', '!=', False)], ['product_group_id'])
+        sub_groups = self.sudo().search_fetch([], ['product_group_id', 'price'], order='sequence, price, id')
+        sub_groups_by_price = {}
+        for sub_group in sub_groups:
+            key = (sub_group.product_group_id.id, float_round(sub_group.price, precision_digits=digits))
+            sub_groups_by_price.setdefault(key, []).append(sub_group.id)
+        index = {
+            'product_groups': {product.id: product.product_group_id.id for product in products},
+            'sub_groups': sub_groups_by_price,
+            'ambiguous': {key: ids for key, ids in sub_groups_by_price.items() if len(ids) > 1},
+        }
+        if index['ambiguous']:
+            _logger.warning(f"Framar Product Groups: Sub groups sharing the same price in their group: {index['ambiguous']}")
+        # Never share an index built from changes that are not committed yet
+        if not combo_recipe.price_index_pending(self.env.cr):
+            cache.set_price_index(index, version, digits)
+        return index
+
+    @api.model
+    def get_pos_combo_components(self, sub_group_ids):
+        """Return ``{sub_group_id: [{product_id, name, quantity}]}`` for the POS.
+
+        Components are not part of the POS catalog; registers fetch them on
+        demand when they show what a combo contains. Served from the recipe
+        cache, so repeated requests cost no compilation.
+        """
+        recipes = self._get_combo_recipes(sub_group_ids)
+        return {
+            sub_group_id: [
+                {'product_id': component['product_id'], 'name': component['name'], 'quantity': component['quantity']}
+                for component in recipe['components']
+            ]
+            for sub_group_id, recipe in recipes.items()
+        }
+
+    @api.model
+    def get_combo_recipe_cache_stats(self):
+        """Return the hit/miss counters of the recipe cache of this worker"""
+        stats = combo_recipe.get_cache(self.env.cr.dbname).stats()
+        stats['version'], stats['catalog_version'] = combo_recipe.get_versions(self.env.cr)
+        return stats
+
     def action_open_components(self):
         """Open components window for this sub group"""
         self.ensure_one()
@@ -259,23 +679,72 @@ class ProductGroupComponent(models.Model):
     _description = 'Product Group Component'
     _order = 'sequence'
 
-    sub_group_id = fields.Many2one('product.group.sub', string='Sub Group', required=True, ondelete='cascade')
-    product_id = fields.Many2one('product.product', string='Component Product', required=True)
+    sub_group_id = fields.Many2one('product.group.sub', string='Sub Group', required=True, ondelete='cascade', index=True)
+    product_id = fields.Many2one('product.product', string='Component Product', index=True)
+    child_sub_group_id = fields.Many2one(
+        'product.group.sub', string='Nested Sub Group', ondelete='restrict', index='btree_not_null',
+        help='Use another sub group as component, e.g. Family Meal = 2 × Rolex 3000 + 1 soda')
     quantity = fields.Float(string='Quantity', required=True, default=1.0, digits='Product Unit of Measure')
     sequence = fields.Integer(string='Sequence', default=10)
     
     # Computed field to display product name and quantity
     display_name = fields.Char(string='Component', compute='_compute_display_name', store=False)
 
-    @api.depends('product_id', 'quantity')
+    @api.depends('product_id', 'child_sub_group_id', 'quantity')
     def _compute_display_name(self):
         for record in self:
-            if record.product_id:
+            if record.product_id or record.child_sub_group_id:
                 qty = int(record.quantity) if record.quantity == int(record.quantity) else record.quantity
-                record.display_name = f"{record.product_id.name} - {qty} pieces"
+                name = record.product_id.name if record.product_id else record.child_sub_group_id.name
+                record.display_name = f"{name} - {qty} pieces"
             else:
                 record.display_name = ""
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ProductGroupComponent, self).create(vals_list)
+        self.env['product.group.sub']._invalidate_combo_recipes(records.sub_group_id.ids)
+        return records
+
+    def write(self, vals):
+        sub_group_ids = set(self.sub_group_id.ids)
+        res = super(ProductGroupComponent, self).write(vals)
+        self.env['product.group.sub']._invalidate_combo_recipes(sub_group_ids | set(self.sub_group_id.ids))
+        return res
+
+    def unlink(self):
+        self.env['product.group.sub']._invalidate_combo_recipes(self.sub_group_id.ids)
+        return super(ProductGroupComponent, self).unlink()
+
+    @api.constrains('product_id', 'child_sub_group_id')
+    def _check_product_or_sub_group(self):
+        for record in self:
+            if bool(record.product_id) == bool(record.child_sub_group_id):
+                raise models.ValidationError('A component must be either a product or a nested sub group')
+
+    @api.constrains('sub_group_id', 'child_sub_group_id')
+    def _check_nested_sub_group_cycle(self):
+        nested = self.filtered('child_sub_group_id')
+        if not nested:
+            return
+        self.flush_model(['sub_group_id', 'child_sub_group_id'])
+        for record in nested:
+            # Sub groups reachable from the nested one, stopping on already seen ones
+            self.env.cr.execute("""
+                WITH RECURSIVE descendants(id) AS (
+                    SELECT %s
+                    UNION
+                    SELECT c.child_sub_group_id FROM product_group_component c
+                    JOIN descendants d ON c.sub_group_id = d.id
+                    WHERE c.child_sub_group_id IS NOT NULL
+                )
+                SELECT 1 FROM descendants WHERE id = %s
+            """, [record.child_sub_group_id.id, record.sub_group_id.id])
+            if self.env.cr.fetchone():
+                raise models.ValidationError(
+                    f'{record.child_sub_group_id.name} cannot be nested in {record.sub_group_id.name}: '
+                    f'it already contains it')
+
     @api.constrains('quantity')
     def _check_quantity(self):
         for record in self:
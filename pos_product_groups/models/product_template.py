@@ -7,9 +7,21 @@ class ProductTemplate(models.Model):
     _inherit = 'product.template'
 
     is_product_group = fields.Boolean(string='Is Product Group (Big Group)', default=False)
-    product_group_id = fields.Many2one('product.group', string='Product Group (Big Group)', ondelete='set null')
+    product_group_id = fields.Many2one('product.group', string='Product Group (Big Group)', ondelete='set null',
+                                       index='btree_not_null')
     is_product_sub_group = fields.Boolean(string='Is Product Sub Group', default=False)
-    product_sub_group_id = fields.Many2one('product.group.sub', string='Product Sub Group', ondelete='set null')
+    product_sub_group_id = fields.Many2one('product.group.sub', string='Product Sub Group', ondelete='set null',
+                                           index='btree_not_null')
+
+    def write(self, vals):
+        """Drop the compiled recipes that use these products as components"""
+        res = super(ProductTemplate, self).write(vals)
+        if 'list_price' in vals or 'name' in vals:
+            components = self.env['product.group.component'].sudo().search([
+                ('product_id.product_tmpl_id', 'in', self.ids),
+            ])
+            self.env['product.group.sub']._invalidate_combo_recipes(components.sub_group_id.ids)
+        return res
 
 
 class ProductProduct(models.Model):
@@ -17,11 +29,20 @@ class ProductProduct(models.Model):
 
     # These fields are inherited from product.template, but we need to make sure
     # they're accessible on product.product for POS
+    # Only a few products are groups or sub groups: the many2ones only index
+    # their non null values
     is_product_group = fields.Boolean(related='product_tmpl_id.is_product_group', readonly=True, store=True)
-    product_group_id = fields.Many2one(related='product_tmpl_id.product_group_id', readonly=True, store=True)
+    product_group_id = fields.Many2one(related='product_tmpl_id.product_group_id', readonly=True, store=True,
+                                       index='btree_not_null')
     is_product_sub_group = fields.Boolean(related='product_tmpl_id.is_product_sub_group', readonly=True, store=True)
-    product_sub_group_id = fields.Many2one(related='product_tmpl_id.product_sub_group_id', readonly=True, store=True)
-
-
-
-
+    product_sub_group_id = fields.Many2one(related='product_tmpl_id.product_sub_group_id', readonly=True, store=True,
+                                           index='btree_not_null')
+
+    def init(self):
+        super().init()
+        # The partial indexes of earlier versions duplicated the btree_not_null
+        # indexes of the same columns
+        self.env.cr.execute("""
+            DROP INDEX IF EXISTS product_product_is_product_group_partial_index,
+                                 product_product_is_product_sub_group_partial_index
+        """)
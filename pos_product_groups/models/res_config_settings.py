@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    pos_product_group_catalog_cache = fields.Boolean(related='pos_config_id.product_group_catalog_cache', readonly=False)
+    pos_product_group_debug_log = fields.Boolean(related='pos_config_id.product_group_debug_log', readonly=False)
+    pos_product_group_deferred_expansion = fields.Boolean(related='pos_config_id.product_group_deferred_expansion', readonly=False)
+    pos_product_group_quick_select = fields.Boolean(related='pos_config_id.product_group_quick_select', readonly=False)
+    pos_product_group_consolidate_component_moves = fields.Boolean(related='pos_config_id.product_group_consolidate_component_moves', readonly=False)
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+
+class StockPicking(models.Model):
+    _inherit = 'stock.picking'
+
+    @api.model
+    def _create_picking_from_pos_order_lines(self, location_dest_id, lines, picking_type, partner=False):
+        """Leave out the component lines whose stock is moved at session close
+        (see ``pos.session._consolidate_combo_component_moves``)"""
+        if self.env.context.get('pos_combo_skip_component_lines'):
+            lines = lines.filtered(lambda line: not line.is_component)
+        return super(StockPicking, self)._create_picking_from_pos_order_lines(
+            location_dest_id, lines, picking_type, partner=partner)
@@ -0,0 +1,62 @@
+/** @odoo-module **/
+
+import { logger } from "./logger";
+
+/**
+ * Persistent copy of the product group catalog in the browser IndexedDB.
+ *
+ * One entry per database and POS config: `{ key, version, since, groups }`, where
+ * `version`/`since` are the catalog tokens the copy corresponds to.
+ * Every failure (private mode, quota, old browser) resolves to "no cache"
+ * so the register falls back to downloading the catalog.
+ */
+const DB_NAME = "pos_product_groups";
+const STORE_NAME = "catalog";
+
+function openDatabase() {
+    return new Promise((resolve, reject) => {
+        if (!window.indexedDB) {
+            reject(new Error("IndexedDB not available"));
+            return;
+        }
+        const request = window.indexedDB.open(DB_NAME, 1);
+        request.onupgradeneeded = () => request.result.createObjectStore(STORE_NAME, { keyPath: "key" });
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function runTransaction(mode, callback) {
+    return openDatabase().then(
+        (db) =>
+            new Promise((resolve, reject) => {
+                const transaction = db.transaction(STORE_NAME, mode);
+                const request = callback(transaction.objectStore(STORE_NAME));
+                transaction.oncomplete = () => {
+                    db.close();
+                    resolve(request.result);
+                };
+                transaction.onerror = () => {
+                    db.close();
+                    reject(transaction.error);
+                };
+            })
+    );
+}
+
+export async function loadCatalog(key) {
+    try {
+        return (await runTransaction("readonly", (store) => store.get(key))) || null;
+    } catch (error) {
+        logger.warn("Could not read the cached catalog:", error.message);
+        return null;
+    }
+}
+
+export async function saveCatalog(key, { version, since, groups }) {
+    try {
+        await runTransaction("readwrite", (store) => store.put({ key, version, since, groups }));
+    } catch (error) {
+        logger.warn("Could not store the catalog:", error.message);
+    }
+}
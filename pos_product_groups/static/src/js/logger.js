@@ -0,0 +1,39 @@
+/** @odoo-module **/
+
+/**
+ * Leveled logging for the module.
+ *
+ * `error` and `warn` always reach the console. `info` and `debug` are no-op
+ * functions unless debug logging is enabled, either with `?debug=assets` or
+ * with the "Combo Debug Logging" option of the POS config (see `configure`),
+ * so hot paths such as `Orderline.get_unit_price` pay a single empty call.
+ * Hot paths must not build expensive arguments (object dumps, `Object.keys`)
+ * unless `logger.debugEnabled` is true.
+ */
+const PREFIX = "Framar Product Groups:";
+
+function noop() {}
+
+export const logger = {
+    debugEnabled: false,
+    debug: noop,
+    info: noop,
+    warn: console.warn.bind(console, PREFIX),
+    error: console.error.bind(console, PREFIX),
+
+    setDebug(enabled) {
+        this.debugEnabled = Boolean(enabled);
+        this.debug = this.debugEnabled ? console.debug.bind(console, PREFIX) : noop;
+        this.info = this.debugEnabled ? console.info.bind(console, PREFIX) : noop;
+    },
+
+    configure(config) {
+        this.setDebug(isAssetsDebug() || Boolean(config && config.product_group_debug_log));
+    },
+};
+
+function isAssetsDebug() {
+    return typeof odoo !== "undefined" && typeof odoo.debug === "string" && odoo.debug.includes("assets");
+}
+
+logger.setDebug(isAssetsDebug());
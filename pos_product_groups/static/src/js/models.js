@@ -1,108 +1,108 @@
 /** @odoo-module **/
 
-import { patch } from "@web/core/utils/patch";
 import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { session } from "@web/session";
+import { ProductGroupStore } from "./product_group_store";
+import { loadCatalog, saveCatalog } from "./catalog_cache";
+import { logger } from "./logger";
 
-console.log("Framar Product Groups: models.js loaded");
+logger.debug("models.js loaded");
 
-// Verify PosStore exists
-console.log("Framar Product Groups: PosStore available?", !!PosStore);
-console.log("Framar Product Groups: PosStore.after_load_server_data exists?", typeof PosStore.prototype.after_load_server_data);
+// Interval between two catalog delta requests from an open register
+const CATALOG_SYNC_INTERVAL = 60 * 1000;
 
 // Store original method
-const originalAfterLoad = PosStore.prototype.after_load_server_data;
+const originalProcessData = PosStore.prototype._processData;
 
 // Apply patch directly to prototype
-PosStore.prototype.after_load_server_data = async function() {
-    console.log("Framar Product Groups: after_load_server_data PATCH CALLED!");
-    const result = await originalAfterLoad.call(this, ...arguments);
-    
-    console.log("Framar Product Groups: after_load_server_data super call completed");
-    
-    // Load product groups after server data is loaded
+// The product group tree (groups → sub groups) is delivered by
+// pos.session._get_pos_ui_product_group with the initial session load, so
+// no extra RPC is needed before the register is usable. Components are only
+// fetched when shown (see getProductGroupComponents).
+PosStore.prototype._processData = async function(loadedData) {
+    const result = await originalProcessData.call(this, ...arguments);
+    logger.configure(this.config);
+    const startedAt = performance.now();
+    const catalog = loadedData["product_group_catalog"] || {};
+    let source = "session";
+    if (this.config.product_group_catalog_cache) {
+        source = await this._loadProductGroupCatalogFromCache(catalog);
+    } else {
+        this.productGroupStore = new ProductGroupStore(loadedData["product.group"] || [], this.db);
+        this.productGroupCatalog = catalog;
+    }
+    this.product_groups = this.productGroupStore.groups;
+    const elapsed = performance.now() - startedAt;
+    performance.measure?.("pos_product_groups:catalog_ready", { start: startedAt, duration: elapsed });
+    logger.debug(`Loaded ${this.product_groups.length} big groups from ${source} in ${elapsed.toFixed(1)} ms`);
+    if (!this.productGroupCatalogTimer) {
+        this.productGroupCatalogTimer = setInterval(() => this.syncProductGroupCatalog(), CATALOG_SYNC_INTERVAL);
+    }
+    return result;
+};
+
+// Warm start from the copy kept on the device. The session data only carries
+// the catalog tokens: when the cached version matches the register is ready
+// without any download, otherwise the changes since the cached copy are
+// fetched in the background. Without a local copy the catalog is downloaded.
+PosStore.prototype._loadProductGroupCatalogFromCache = async function(catalog) {
+    const cached = await loadCatalog(this._productGroupCatalogKey());
+    this.productGroupStore = new ProductGroupStore(cached ? cached.groups : [], this.db);
+    if (!cached) {
+        this.productGroupCatalog = {};
+        await this.syncProductGroupCatalog();
+        return "server";
+    }
+    this.productGroupCatalog = { since: cached.since, version: cached.version };
+    if (cached.version !== catalog.version) {
+        this.syncProductGroupCatalog();
+        return "device cache (refreshing)";
+    }
+    return "device cache";
+};
+
+// Components of a sub group, e.g. to show what a combo contains
+PosStore.prototype.getProductGroupComponents = function(subGroupId) {
+    return this.productGroupStore.getComponents(subGroupId, this.orm);
+};
+
+// The catalog version is a counter of each database: databases served from
+// the same origin share the IndexedDB, so the key names the database too
+PosStore.prototype._productGroupCatalogKey = function() {
+    return `${session.db}/config_${this.config.id}`;
+};
+
+// Pull the catalog changes made since the last sync and patch the store in place,
+// so price changes reach open registers without reloading the session
+PosStore.prototype.syncProductGroupCatalog = async function() {
+    const { since, version } = this.productGroupCatalog || {};
+    let delta;
     try {
-        console.log("Framar Product Groups: Starting to load product groups...");
-        console.log("Framar Product Groups: ORM available?", !!this.orm);
-        
-        if (!this.orm) {
-            console.error("Framar Product Groups: ORM not available!");
-            this.product_groups = [];
-            return result;
-        }
-        
-        const productGroups = await this.orm.searchRead(
-            "product.group",
-            [["active", "=", true]],
-            ["name", "sub_group_ids", "product_template_id"]
-        );
-        
-        console.log(`Framar Product Groups: Found ${productGroups.length} big groups`, productGroups);
-        
-        // Load sub groups for each big group
-        for (let group of productGroups) {
-            try {
-                console.log(`Framar Product Groups: Loading sub groups for group ${group.id} (${group.name})...`);
-                const subGroups = await this.orm.searchRead(
-                    "product.group.sub",
-                    [["product_group_id", "=", group.id], ["active", "=", true]],
-                    ["name", "price", "sequence", "component_ids", "product_template_id"]
-                );
-                console.log(`Framar Product Groups: Found ${subGroups.length} sub groups for "${group.name}":`, subGroups);
-                
-                // Sort by sequence, handling missing sequence values
-                group.sub_groups = subGroups.sort((a, b) => {
-                    const seqA = a.sequence || 10;
-                    const seqB = b.sequence || 10;
-                    return seqA - seqB;
-                });
-                
-                // Add parent group info to each sub group for easy access
-                group.sub_groups.forEach(subGroup => {
-                    subGroup.product_group_id = group.id;
-                    subGroup.product_group_name = group.name;
-                });
-                
-                console.log(`Framar Product Groups: Sorted ${group.sub_groups.length} sub groups for "${group.name}"`);
-                
-                // Load components for each sub group
-                for (let subGroup of group.sub_groups) {
-                    try {
-                        const components = await this.orm.searchRead(
-                            "product.group.component",
-                            [["sub_group_id", "=", subGroup.id]],
-                            ["product_id", "quantity", "sequence"]
-                        );
-                        subGroup.components = components.sort((a, b) => {
-                            const seqA = a.sequence || 10;
-                            const seqB = b.sequence || 10;
-                            return seqA - seqB;
-                        });
-                    } catch (componentError) {
-                        console.error(`Framar Product Groups: Error loading components for sub group ${subGroup.id}:`, componentError);
-                        subGroup.components = [];
-                    }
-                }
-                
-                console.log(`Framar Product Groups: Loaded big group "${group.name}" with ${group.sub_groups.length} sub groups`);
-                if (group.sub_groups.length > 0) {
-                    console.log(`Framar Product Groups: Sub groups for "${group.name}":`, group.sub_groups.map(sg => ({ id: sg.id, name: sg.name, price: sg.price })));
-                }
-            } catch (subGroupError) {
-                console.error(`Framar Product Groups: Error loading sub groups for group ${group.id}:`, subGroupError);
-                group.sub_groups = [];
-            }
-        }
-        
-        this.product_groups = productGroups || [];
-        console.log("Framar Product Groups: Product groups loaded successfully", this.product_groups);
+        delta = await this.orm.silent.call("product.group", "get_pos_catalog_delta", [], { since, version });
     } catch (error) {
-        console.error("Framar Product Groups: Error loading product groups:", error);
-        console.error("Framar Product Groups: Error details:", error.message, error.stack);
-        this.product_groups = [];
+        // Offline or server busy: keep the current catalog and retry next time
+        logger.warn("Catalog sync failed, keeping current catalog:", error.message);
+        return;
+    }
+    this.productGroupCatalog = { since: delta.since, version: delta.version };
+    if (!delta.unchanged) {
+        this.productGroupStore.applyDelta(delta, this.db);
+        logger.debug(`Applied catalog delta (version ${version} → ${delta.version})`);
+        if (this.config.product_group_catalog_cache) {
+            await saveCatalog(this._productGroupCatalogKey(), {
+                ...this.productGroupCatalog,
+                groups: this.productGroupStore.serialize(),
+            });
+        }
     }
-    
-    return result;
 };
 
-console.log("Framar Product Groups: Patch applied to PosStore.prototype.after_load_server_data");
+// Only the order synchronization of the register may commit its batch by
+// chunks (see pos.order.create_from_ui), never the other callers
+const originalGetCreateOrderContext = PosStore.prototype._getCreateOrderContext;
+PosStore.prototype._getCreateOrderContext = function() {
+    const context = originalGetCreateOrderContext ? originalGetCreateOrderContext.call(this, ...arguments) : this.context;
+    return { ...context, pos_combo_sync_commit: true };
+};
 
+logger.debug("Patch applied to PosStore.prototype._processData");
@@ -3,60 +3,99 @@
 import { patch } from "@web/core/utils/patch";
 import { Orderline } from "@point_of_sale/app/store/models";
 import { roundDecimals as round_di } from "@web/core/utils/numbers";
+import { logger } from "./logger";
 
-console.log("Framar Product Groups: orderline_patch.js loaded");
-console.log("Framar Product Groups: Orderline class:", Orderline);
+logger.debug("orderline_patch.js loaded");
 
-patch(Orderline, {
+// Price lock: a sub group line always sells at `product_sub_group_price`.
+// The lock is purely declarative - every price accessor of the line consults
+// `get_locked_price()` - so no timer, watcher or per-instance property is
+// needed to keep the price when the quantity or the pricelist changes.
+patch(Orderline.prototype, {
     setup(_defaultObj, options) {
-        super.setup(...arguments);
-        // Initialize product group data
+        // Initialize product group data before super.setup, which restores
+        // it from JSON when the line is rebuilt from a saved order
         this.product_group_id = null;
         this.product_group_name = null;
         this.product_sub_group_id = null;
         this.product_sub_group_name = null;
         this.product_sub_group_price = null;  // Store original sub group price
-        this._price_locked = false;  // Flag to prevent price changes
-        
-        // If price_type is "manual" in options and we have a price, ensure it's preserved
-        // This happens before set_quantity is called, so we need to set price_type early
-        if (options && options.price_type === "manual" && options.price !== undefined) {
-            // Price type will be set by super.setup, but ensure we keep it as manual
-            this.price_type = "manual";
-            this.product_sub_group_price = options.price;  // Store the price immediately
-            this._price_locked = true;  // Lock the price
-            console.log("Framar Product Groups: Setup - Set price_type to manual from options, price:", options.price);
+        this.product_group_catalog_version = null;  // Catalog version the line was sold with
+        super.setup(...arguments);
+    },
+    
+    /**
+     * Return the price this line is locked at, or null for regular lines.
+     */
+    get_locked_price() {
+        if (this.product_sub_group_id && this.product_sub_group_price !== null && this.product_sub_group_price !== undefined) {
+            return this.product_sub_group_price;
         }
-        
-        // Watch for price changes using a property descriptor
-        // This ensures any direct property assignment is intercepted
-        if (this._price_locked && this.product_sub_group_price) {
-            const self = this;
-            Object.defineProperty(this, 'price', {
-                get: function() {
-                    return self.product_sub_group_price || self._price || 0;
-                },
-                set: function(value) {
-                    if (self._price_locked && self.product_sub_group_price) {
-                        console.log("Framar Product Groups: Blocked direct price assignment:", value, "keeping:", self.product_sub_group_price);
-                        self._price = self.product_sub_group_price;
-                        return;
-                    }
-                    self._price = value;
-                },
-                configurable: true
-            });
+        return null;
+    },
+    
+    /**
+     * Whether this line already sells `subGroupId` of `productId` at
+     * `lockedPrice`, so that selecting the same sub group again only increases
+     * its quantity (see PosStore._addSubGroupToOrder).
+     */
+    is_same_sub_group_selection(productId, subGroupId, lockedPrice) {
+        return Boolean(
+            this.product_sub_group_id
+            && this.product_sub_group_id === subGroupId
+            && this.get_product().id === productId
+            && this.get_locked_price() !== null
+            && Math.abs(this.get_locked_price() - lockedPrice) < 0.01
+            && !this.get_discount()
+            && !this.get_customer_note()
+            && !this.refunded_orderline_id
+            && !this.skipChange
+        );
+    },
+    
+    // Sub group lines carry a manual price and their own data, which the
+    // standard rule (pricelist price, product name) does not know about: they
+    // only merge with a line of the same sub group at the same locked price,
+    // never with a regular line of the group product
+    can_be_merged_with(orderline) {
+        if (!this.product_sub_group_id && !orderline.product_sub_group_id) {
+            return super.can_be_merged_with(...arguments);
         }
+        return Boolean(
+            orderline.product_sub_group_id
+            && orderline.get_locked_price() !== null
+            && this.is_same_sub_group_selection(
+                orderline.get_product().id, orderline.product_sub_group_id, orderline.get_locked_price())
+            && !orderline.get_discount()
+            && orderline.get_customer_note() === this.get_customer_note()
+            && !orderline.skipChange
+        );
     },
     
     init_from_JSON(json) {
         super.init_from_JSON(...arguments);
-        // Load product group data from JSON
-        if (json.product_group_id || json.product_sub_group_id) {
-            this.product_group_id = json.product_group_id;
-            this.product_group_name = json.product_group_name;
-            this.product_sub_group_id = json.product_sub_group_id;
-            this.product_sub_group_name = json.product_sub_group_name;
+        // Load product group data from JSON in the compact (`combo`) or the
+        // previous explicit format, preferring the names of the loaded catalog.
+        // The whole combo state is restored, price lock included, so that an
+        // order reloaded from the device (tablet reload, offline restore) is
+        // exported exactly as before and synced without any server side price
+        // matching: `price_unit` was pinned to the locked price on export.
+        const [subGroupId, catalogVersion] = json.combo
+            || [json.product_sub_group_id, json.product_group_catalog_version || null];
+        if (json.product_group_id || subGroupId) {
+            const subGroup = subGroupId && this.pos.productGroupStore
+                ? this.pos.productGroupStore.getSubGroup(subGroupId)
+                : undefined;
+            this.product_group_id = subGroup ? subGroup.product_group_id : json.product_group_id;
+            this.product_group_name = subGroup ? subGroup.product_group_name : json.product_group_name;
+            this.product_sub_group_id = subGroupId || null;
+            this.product_sub_group_name = subGroup ? subGroup.name : json.product_sub_group_name;
+            this.product_group_catalog_version = catalogVersion;
+            const lockedPrice = json.product_sub_group_price ?? json.price_unit;
+            if (subGroupId && lockedPrice !== null && lockedPrice !== undefined) {
+                this.product_sub_group_price = lockedPrice;
+                this.price_type = "manual";
+            }
         }
     },
     
@@ -65,81 +104,21 @@ patch(Orderline, {
         this.product_group_name = data.product_group_name;
         this.product_sub_group_id = data.product_sub_group_id;
         this.product_sub_group_name = data.product_sub_group_name;
-        this.product_sub_group_price = data.price || null;  // Store the sub group price
-        
-        console.log("Framar Product Groups: set_product_group_data called with:", {
-            product_sub_group_id: this.product_sub_group_id,
-            product_sub_group_name: this.product_sub_group_name,
-            product_group_id: this.product_group_id,
-            product_group_name: this.product_group_name,
-            price: this.product_sub_group_price
-        });
+        this.product_sub_group_price = data.price ?? null;  // Store the sub group price, 0 included
+        this.product_group_catalog_version = (this.pos.productGroupCatalog || {}).version || null;
         
         // Update display name for receipt
         if (data.display_name) {
             this.full_product_name = data.display_name;
         }
         
-        // IMPORTANT: Set price_type to "manual" to prevent Odoo from recalculating price when quantity changes
-        if (this.product_sub_group_id) {
+        // Set price_type to "manual" so Odoo never recomputes the price from the pricelist
+        const lockedPrice = this.get_locked_price();
+        if (lockedPrice !== null) {
             this.price_type = "manual";
-            this._price_locked = true;  // Lock the price
-            console.log("Framar Product Groups: Set price_type to 'manual' for sub group to prevent price recalculation");
-        }
-        
-        // Set the price immediately and ensure it's locked
-        if (this.product_sub_group_price !== null) {
-            const lockedPrice = this.product_sub_group_price;
-            
-            // Set the price to the sub-group price
-            super.set_unit_price.call(this, lockedPrice);
-            
-            // Store a backup in case the property gets modified
-            this._locked_sub_group_price = lockedPrice;
-            
-            // CRITICAL: Override the price property to always return the locked price
-            // This ensures that even if something tries to change it, it will always show the correct price
-            const self = this;
-            try {
-                // Delete the existing price property if it exists as an own property
-                if (this.hasOwnProperty('price')) {
-                    delete this.price;
-                }
-                
-                // Define a new price property that always returns the locked price
-                Object.defineProperty(this, 'price', {
-                    get: function() {
-                        // If we have a locked sub-group price, ALWAYS return it
-                        if (self._price_locked && self._locked_sub_group_price !== null && self._locked_sub_group_price !== undefined) {
-                            return self._locked_sub_group_price;
-                        }
-                        // Fallback: use stored internal price or locked price
-                        return self._internal_price !== undefined ? self._internal_price : (self._locked_sub_group_price || lockedPrice);
-                    },
-                    set: function(value) {
-                        // If price is locked, ALWAYS ignore attempts to change it
-                        if (self._price_locked && self._locked_sub_group_price !== null && self._locked_sub_group_price !== undefined) {
-                            console.log("Framar Product Groups: BLOCKED price property set to", value, "- keeping locked price:", self._locked_sub_group_price);
-                            // Don't even store the new value - completely ignore it
-                            return;
-                        }
-                        // Only store if not locked
-                        self._internal_price = value;
-                    },
-                    configurable: true,
-                    enumerable: true
-                });
-                
-                // Initialize both internal price and locked price to the sub-group price
-                this._internal_price = lockedPrice;
-                
-                console.log("Framar Product Groups: Price property locked at", lockedPrice, "- getter/setter installed");
-            } catch (e) {
-                console.warn("Framar Product Groups: Could not override price property:", e);
-                // Fallback: just store the price
-                this._internal_price = lockedPrice;
-            }
+            super.set_unit_price(lockedPrice);
         }
+        logger.debug("set_product_group_data - sub group:", this.product_sub_group_id, "locked price:", lockedPrice);
     },
     
     export_for_printing() {
@@ -168,129 +147,52 @@ patch(Orderline, {
     export_as_JSON() {
         const result = super.export_as_JSON(...arguments);
         
-        console.log("Framar Product Groups: export_as_JSON called. this.product_sub_group_id =", this.product_sub_group_id, "current price_unit:", result.price_unit);
-        
-        // ALWAYS include product group data when exporting order - even if null/undefined
-        // This ensures the backend can detect and expand sub groups
-        result.product_sub_group_id = this.product_sub_group_id || null;
-        result.product_sub_group_name = this.product_sub_group_name || null;
-        result.product_group_id = this.product_group_id || null;
-        result.product_group_name = this.product_group_name || null;
-        result.is_component = this.is_component || false;
+        // Compact wire format: regular lines carry nothing extra, sub group lines
+        // only `combo: [sub group id, catalog version]`. The backend resolves the
+        // names and the group from its recipe data (see pos.order._expand_combo_lines).
+        if (this.product_sub_group_id) {
+            result.combo = [this.product_sub_group_id, this.product_group_catalog_version];
+        }
         
         // CRITICAL: If this is a sub group item, ALWAYS use the original sub group price as price_unit
         // This ensures the backend can match it correctly, even if quantity changed
-        if (this.product_sub_group_id && this.product_sub_group_price !== null && this.product_sub_group_price !== undefined) {
-            result.price_unit = this.product_sub_group_price;  // Force unit price to be the sub group price
-            console.log("Framar Product Groups: ✓ Forced price_unit to sub group price:", this.product_sub_group_price, "(was:", result.price_unit, ")");
-            console.log("Framar Product Groups: ✓ Orderline exported with product_sub_group_id:", this.product_sub_group_id, "price_unit:", result.price_unit);
+        if (this.get_locked_price() !== null) {
+            result.price_unit = this.get_locked_price();  // Force unit price to be the sub group price
+            logger.debug("✓ Orderline exported with product_sub_group_id:", this.product_sub_group_id, "price_unit:", result.price_unit);
         } else if (this.product_sub_group_id) {
-            console.log("Framar Product Groups: ✓ Orderline exported with product_sub_group_id:", this.product_sub_group_id, "but no stored price!");
-            console.log("Framar Product Groups: Export result keys:", Object.keys(result));
-        } else {
-            console.log("Framar Product Groups: ⚠ Orderline exported WITHOUT product_sub_group_id");
-            console.log("Framar Product Groups: this.product_sub_group_id:", this.product_sub_group_id);
-            console.log("Framar Product Groups: this keys:", Object.keys(this).filter(k => k.includes('group')));
+            logger.debug("✓ Orderline exported with product_sub_group_id:", this.product_sub_group_id, "but no stored price!");
         }
         
         return result;
     },
     
-    // Store original sub group price to preserve it when quantity changes
     // CRITICAL: When quantity changes, the unit price MUST NEVER change - only the total should change
-    set_quantity(newQty, keep_price) {
-        console.log("Framar Product Groups: set_quantity called - qty:", newQty, "keep_price:", keep_price, "product_sub_group_id:", this.product_sub_group_id, "current price:", this.price);
-        
-        // If this line has a sub group, preserve the price and prevent any recalculation
-        const preservePrice = this.product_sub_group_price;
-        
-        if (this.product_sub_group_id && preservePrice !== null && preservePrice !== undefined) {
-            // Store the locked price
-            this._price_locked = true;
-            this.price_type = "manual";
-            console.log("Framar Product Groups: Sub group detected - locking price at:", preservePrice);
-            
-            // Store current internal price (might be different from what we display)
-            const originalInternalPrice = this.price;
-            
-            // Call super with keep_price to prevent price recalculation
-            const result = super.set_quantity(newQty, "keep_price");
-            
-            // IMMEDIATELY restore the price after quantity change
-            // This ensures the internal price stays at the sub-group price
-            this.price_type = "manual";
-            this._price_locked = true;
-            
-            // Force the internal price to be the sub-group price
-            // Even though get_unit_price() will override the display, we need the internal price correct too
-            if (Math.abs(parseFloat(this.price) - parseFloat(preservePrice)) > 0.01) {
-                console.log("Framar Product Groups: Internal price changed from", this.price, "to", preservePrice, "- restoring");
-                super.set_unit_price.call(this, preservePrice);
-            }
-            
-            // Set up monitoring to catch any delayed price changes
-            const self = this;
-            const checkAndRestore = () => {
-                if (self.product_sub_group_id && Math.abs(parseFloat(self.price) - parseFloat(preservePrice)) > 0.01) {
-                    console.log("Framar Product Groups: [Monitor] Price changed to", self.price, "- restoring to", preservePrice);
-                    self.price_type = "manual";
-                    self._price_locked = true;
-                    super.set_unit_price.call(self, preservePrice);
-                }
-            };
-            
-            // Check immediately after current stack
-            Promise.resolve().then(checkAndRestore);
-            
-            // Check after a short delay
-            setTimeout(checkAndRestore, 50);
-            setTimeout(checkAndRestore, 200);
-            
-            console.log("Framar Product Groups: Quantity changed to", newQty, "- price locked at", preservePrice);
-            return result;
+    set_quantity(quantity, keep_price) {
+        if (this.get_locked_price() !== null) {
+            return super.set_quantity(quantity, "keep_price");
         }
-        
-        // For regular products, call super normally
         return super.set_quantity(...arguments);
     },
     
-    // Override get_unit_price to ALWAYS return the sub-group price for locked items
-    // This ensures the price displayed and exported is ALWAYS the sub-group price
+    // The price displayed and exported for a locked line is ALWAYS the sub-group price
     get_unit_price() {
-        // If this is a sub-group item with a locked price, ALWAYS return that price
-        if (this.product_sub_group_id && this.product_sub_group_price !== null && this.product_sub_group_price !== undefined) {
+        const lockedPrice = this.get_locked_price();
+        if (lockedPrice !== null) {
             const digits = this.pos.dp["Product Price"];
-            const lockedPrice = parseFloat(round_di(this.product_sub_group_price || 0, digits).toFixed(digits));
-            console.log("Framar Product Groups: get_unit_price - returning locked sub-group price:", lockedPrice, "(internal price is:", this.price, ")");
-            return lockedPrice;
+            return parseFloat(round_di(lockedPrice || 0, digits).toFixed(digits));
         }
-        
-        // For regular products, use the normal calculation
         return super.get_unit_price(...arguments);
     },
     
-    // Also override set_unit_price to prevent price changes for sub groups
+    // Any attempt to change the price of a locked line keeps the sub-group price
     set_unit_price(price) {
-        console.log("Framar Product Groups: set_unit_price called - new price:", price, "product_sub_group_id:", this.product_sub_group_id, "stored price:", this.product_sub_group_price);
-        
-        // If this line has a stored sub group price, always preserve it
-        if (this.product_sub_group_price !== null && this.product_sub_group_price !== undefined && this.product_sub_group_id) {
-            // Block ANY price changes that don't match the sub group price
-            // This is a critical safety net - no exceptions!
-            if (Math.abs(parseFloat(price) - parseFloat(this.product_sub_group_price)) > 0.01) {
-                console.log("Framar Product Groups: BLOCKED price change from", this.price, "to", price, "- forcing back to sub group price:", this.product_sub_group_price);
-                // Force price_type to manual first
-                this.price_type = "manual";
-                this._price_locked = true;
-                // Then set the correct price (even though get_unit_price will override it)
-                return super.set_unit_price.call(this, this.product_sub_group_price);
-            }
+        const lockedPrice = this.get_locked_price();
+        if (lockedPrice !== null && Math.abs(parseFloat(price) - parseFloat(lockedPrice)) > 0.01) {
+            logger.debug("BLOCKED price change to", price, "- keeping sub group price:", lockedPrice);
+            return super.set_unit_price(lockedPrice);
         }
-        
-        // For regular products, allow price change
-        return super.set_unit_price.call(this, price);
+        return super.set_unit_price(...arguments);
     },
-    
 });
 
 
@@ -1,14 +1,17 @@
 /** @odoo-module **/
 
 import { AbstractAwaitablePopup } from "@point_of_sale/app/popup/abstract_awaitable_popup";
+import { usePos } from "@point_of_sale/app/store/pos_hook";
+import { logger } from "./logger";
 
-console.log("Framar Product Groups: product_group_popup.js loaded");
+logger.debug("product_group_popup.js loaded");
 
 export class ProductGroupPriceVariantPopup extends AbstractAwaitablePopup {
     static template = "pos_product_groups.ProductGroupPriceVariantPopup";
     
     static props = {
         productGroup: { type: Object, optional: true },
+        productGroupId: { type: Number, optional: true },
         zIndex: { type: Number, optional: true },
         cancelKey: { type: String, optional: true },
         confirmKey: { type: String, optional: true },
@@ -18,36 +21,36 @@ export class ProductGroupPriceVariantPopup extends AbstractAwaitablePopup {
     };
     
     setup() {
-        console.log("Framar Product Groups: Popup setup called");
+        logger.debug("Popup setup called");
         super.setup(...arguments);
+        this.pos = usePos();
         this.selectedVariant = null;
         
-        console.log("Framar Product Groups: Popup props:", this.props);
-        console.log("Framar Product Groups: ProductGroup in props:", this.props?.productGroup);
-        console.log("Framar Product Groups: Sub groups in props:", this.props?.productGroup?.sub_groups);
+        logger.debug("Popup props:", this.props);
+        logger.debug("ProductGroup in props:", this.props?.productGroup);
+        logger.debug("Sub groups in props:", this.props?.productGroup?.sub_groups);
         
         this.selectSubGroupHandler = (subGroup) => {
-            console.log("Framar Product Groups: Sub group selected:", subGroup);
+            logger.debug("Sub group selected:", subGroup);
             this.selectedVariant = subGroup;
             this.confirm();
         };
     }
     
     mounted() {
-        console.log("Framar Product Groups: Popup mounted - should be visible now");
-        console.log("Framar Product Groups: Sub groups count:", this.subGroups.length);
+        logger.debug("Popup mounted - should be visible now");
+        logger.debug("Sub groups count:", this.subGroups.length);
     }
     
     get productGroup() {
-        const pg = this.props?.productGroup || {};
-        console.log("Framar Product Groups: productGroup getter:", pg);
-        return pg;
+        // The product group store is the single source of the catalog
+        return (this.props?.productGroupId && this.pos.productGroupStore?.getGroup(this.props.productGroupId))
+            || this.props?.productGroup || {};
     }
     
     get subGroups() {
-        const subGroups = this.productGroup?.sub_groups || [];
-        console.log("Framar Product Groups: subGroups getter returning:", subGroups.length, "items");
-        return subGroups;
+        // Called on every render: no logging here
+        return this.productGroup?.sub_groups || [];
     }
     
     format_currency(amount) {
@@ -58,9 +61,9 @@ export class ProductGroupPriceVariantPopup extends AbstractAwaitablePopup {
     }
     
     async getPayload() {
-        console.log("Framar Product Groups: getPayload called, returning:", this.selectedVariant);
+        logger.debug("getPayload called, returning:", this.selectedVariant);
         return this.selectedVariant;
     }
 }
 
-console.log("Framar Product Groups: ProductGroupPriceVariantPopup class exported");
+logger.debug("ProductGroupPriceVariantPopup class exported");
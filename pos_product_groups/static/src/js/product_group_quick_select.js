@@ -0,0 +1,74 @@
+/** @odoo-module **/
+
+import { Component, useExternalListener } from "@odoo/owl";
+import { usePos } from "@point_of_sale/app/store/pos_hook";
+import { ProductsWidget } from "@point_of_sale/app/screens/product_screen/product_list/product_list";
+import { logger } from "./logger";
+
+logger.debug("product_group_quick_select.js loaded");
+
+/**
+ * One-tap combo selling strip, shown above the product list when the
+ * "One-Tap Combo Selling" option of the POS config is set.
+ *
+ * Every group sold in the POS gets a row with one tile per sub group, taken
+ * as is from ProductGroupStore.getTiles (sorted, prices formatted once per
+ * catalog load). A tap on a tile adds the sub group line directly. Tapping
+ * the group product arms its row for a single keystroke: a number key 1-9
+ * then selects a tile of the row. Any other key, a tile tap or a tap anywhere
+ * else disarms it, so that the keys typed afterwards (quantity, price,
+ * numpad mode) reach the number buffer as usual.
+ */
+export class ProductGroupQuickSelect extends Component {
+    static template = "pos_product_groups.ProductGroupQuickSelect";
+    static props = {};
+
+    setup() {
+        this.pos = usePos();
+        // Capture phase: a digit selecting a tile must not also reach the number buffer
+        useExternalListener(window, "keyup", this.onWindowKeyup.bind(this), { capture: true });
+        // Runs before the click handlers: only the tap on the group product re-arms
+        useExternalListener(window, "pointerdown", () => (this.pos.activeProductGroupId = null), {
+            capture: true,
+        });
+    }
+
+    get rows() {
+        return this.pos.getProductGroupTiles((amount) => this.formatPrice(amount));
+    }
+
+    formatPrice(amount) {
+        if (this.env?.utils?.formatCurrency) {
+            return this.env.utils.formatCurrency(amount);
+        }
+        return amount?.toString() || "0";
+    }
+
+    onTileClick(row, tile) {
+        this.pos.addProductGroupTile(row, tile);
+    }
+
+    onWindowKeyup(ev) {
+        const groupId = this.pos.activeProductGroupId;
+        if (!groupId || ["Shift", "Control", "Alt", "Meta"].includes(ev.key)) {
+            return;
+        }
+        if (["INPUT", "TEXTAREA"].includes(ev.target?.tagName) || ev.target?.isContentEditable) {
+            return;
+        }
+        // Armed for this keystroke only, Escape included
+        this.pos.activeProductGroupId = null;
+        if (ev.ctrlKey || ev.altKey || ev.metaKey || !/^[1-9]$/.test(ev.key)) {
+            return;
+        }
+        const row = this.rows.find((row) => row.groupId === groupId);
+        const tile = row && row.tiles.find((tile) => tile.key === ev.key);
+        if (tile) {
+            ev.stopPropagation();
+            ev.preventDefault();
+            this.pos.addProductGroupTile(row, tile);
+        }
+    }
+}
+
+ProductsWidget.components = { ...ProductsWidget.components, ProductGroupQuickSelect };
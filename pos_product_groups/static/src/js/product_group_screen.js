@@ -3,8 +3,9 @@
 import { patch } from "@web/core/utils/patch";
 import { PosStore } from "@point_of_sale/app/store/pos_store";
 import { ProductGroupPriceVariantPopup } from "./product_group_popup";
+import { logger } from "./logger";
 
-console.log("Framar Product Groups: product_group_screen.js loaded");
+logger.debug("product_group_screen.js loaded");
 
 const originalAddProduct = PosStore.prototype.addProductToCurrentOrder;
 
@@ -27,61 +28,58 @@ PosStore.prototype.addProductToCurrentOrder = async function(product, options =
     // STOP HERE - This IS a product group - DO NOT add it normally!
     // We MUST show popup first, then only add if user selects a sub group
     
-    // Get product group ID
-    let productGroupId = null;
-    if (product.product_group_id) {
-        productGroupId = Array.isArray(product.product_group_id) 
-            ? product.product_group_id[0] 
-            : (product.product_group_id.id || product.product_group_id);
-    }
-    
-    if (!productGroupId) {
-        console.error("Framar Product Groups: Product group ID not found - cannot show popup");
-        // DO NOT add product - just return
-        return;
-    }
-    
-    // Find the product group in loaded data
-    const productGroup = (this.product_groups || []).find(pg => pg.id === productGroupId);
+    // O(1) lookup in the product group store built at load time
+    const productGroup = this.productGroupStore && this.productGroupStore.getGroupForProduct(product);
     
     if (!productGroup) {
-        console.error("Framar Product Groups: Product group", productGroupId, "not found in loaded groups");
+        logger.error("Product group of product", product.id, "not found in loaded groups");
         // DO NOT add product - just return
         return;
     }
     
     // Check if sub groups exist
     if (!productGroup.sub_groups || productGroup.sub_groups.length === 0) {
-        console.error("Framar Product Groups: No sub groups found for", productGroup.name);
+        logger.error("No sub groups found for", productGroup.name);
         // DO NOT add product - just return
         return;
     }
     
+    // One-tap mode: the sub groups are already on screen as tiles, tapping the
+    // group product only arms its row for the next number key
+    if (this.config.product_group_quick_select) {
+        this.activeProductGroupId = productGroup.id;
+        return;
+    }
+    
     // FORCE POPUP TO SHOW - This is mandatory for product groups
+    const tappedAt = performance.now();
     try {
-        console.log("Framar Product Groups: Showing popup for product group:", productGroup.name);
-        console.log("Framar Product Groups: Sub groups to show:", productGroup.sub_groups.length);
+        logger.debug("Showing popup for product group:", productGroup.name);
+        logger.debug("Sub groups to show:", productGroup.sub_groups.length);
         
         const result = await this.env.services.popup.add(ProductGroupPriceVariantPopup, {
-                        productGroup: productGroup,
+                        productGroupId: productGroup.id,
                     });
         
-        console.log("Framar Product Groups: Popup result:", result);
+        logger.debug("Popup result:", result);
         
         // ONLY add product if user confirmed and selected a sub group
         if (result && result.confirmed && result.payload) {
             const selectedSubGroup = result.payload;
-            console.log("Framar Product Groups: User selected sub group:", selectedSubGroup.name);
-            await this._addSubGroupToOrder(product, selectedSubGroup, options);
+            logger.debug("User selected sub group:", selectedSubGroup.name);
+            const line = await this._addSubGroupToOrder(product, selectedSubGroup, options);
+            if (line) {
+                this._recordProductGroupTapToLine("popup", tappedAt, 2);
+            }
             return;
         }
         
         // User cancelled - DO NOT add anything
-        console.log("Framar Product Groups: User cancelled popup - not adding product");
+        logger.debug("User cancelled popup - not adding product");
                             return;
                     } catch (error) {
-        console.error("Framar Product Groups: ERROR showing popup:", error);
-        console.error("Framar Product Groups: Error details:", error.message, error.stack);
+        logger.error("ERROR showing popup:", error);
+        logger.error("Error details:", error.message, error.stack);
         // DO NOT fall back to default - product groups should ALWAYS show popup
         // If popup fails, don't add the product
                 return;
@@ -99,27 +97,42 @@ PosStore.prototype._addSubGroupToOrder = async function(product, subGroup, optio
     // Use sub group price
     const price = subGroup.price || 0;
     
+    // Selecting the same sub group again at the same price increases the
+    // quantity of its line instead of stacking a duplicate: one line to render,
+    // export and expand for "5x Rolex 1500"
+    if (options.merge !== false) {
+        const existingLine = order.get_orderlines().find(
+            (orderline) => orderline.is_same_sub_group_selection(product.id, subGroup.id, price)
+        );
+        if (existingLine) {
+            existingLine.set_quantity(existingLine.get_quantity() + (options.quantity || 1));
+            order.select_orderline(existingLine);
+            logger.debug("_addSubGroupToOrder - merged into line of sub group", subGroup.id, "qty:", existingLine.get_quantity());
+            this.numberBuffer.reset();
+            return existingLine;
+        }
+    }
+    
     // IMPORTANT: Set price_type in options to "manual" BEFORE adding product
     // This prevents Odoo from recalculating the price
     const productOptions = { 
         ...options, 
         price: price,
-        price_type: "manual"  // Set price_type to manual to lock the price
+        price_type: "manual",  // Set price_type to manual to lock the price
+        merge: false,  // Merging of sub group lines is handled above
     };
     
-    console.log("Framar Product Groups: _addSubGroupToOrder - Adding product with price:", price, "price_type: manual");
+    logger.debug("_addSubGroupToOrder - Adding product with price:", price, "price_type: manual");
     
     // add_product is async, so await it
     const line = await order.add_product(product, productOptions);
     
     if (!line) {
-        console.error("Framar Product Groups: ERROR - line is null or undefined!");
+        logger.error("ERROR - line is null or undefined!");
         this.numberBuffer.reset();
         return;
     }
     
-    console.log("Framar Product Groups: _addSubGroupToOrder - line created:", line, "line.price:", line.price, "line.price_type:", line.price_type);
-    
     // Prepare sub group data
     const subGroupData = {
         product_group_id: subGroup.product_group_id || null,
@@ -130,57 +143,60 @@ PosStore.prototype._addSubGroupToOrder = async function(product, subGroup, optio
         price: subGroup.price || 0,
     };
     
-    // Store sub group info FIRST - try using the patched method, fallback to manual assignment
-    if (line.set_product_group_data && typeof line.set_product_group_data === 'function') {
-        console.log("Framar Product Groups: Using set_product_group_data method with price:", subGroup.price);
-        line.set_product_group_data(subGroupData);
-        console.log("Framar Product Groups: After set_product_group_data - price:", line.price, "price_type:", line.price_type, "product_sub_group_price:", line.product_sub_group_price, "locked:", line._price_locked);
-    } else {
-        // FALLBACK: Manually set all properties if patch method isn't available
-        console.warn("Framar Product Groups: set_product_group_data method not available, using manual assignment");
-        line.product_group_id = subGroupData.product_group_id;
-        line.product_group_name = subGroupData.product_group_name;
-        line.product_sub_group_id = subGroupData.product_sub_group_id;
-        line.product_sub_group_name = subGroupData.product_sub_group_name;
-        line.product_sub_group_price = subGroupData.price;
-        line._price_locked = true;
-        
-        // Update display name
-        if (subGroupData.display_name) {
-            line.full_product_name = subGroupData.display_name;
-        }
-        
-        console.log("Framar Product Groups: Manually set sub group data - product_sub_group_id:", line.product_sub_group_id, "price:", line.product_sub_group_price);
-    }
+    // Store sub group info and lock the line at the sub group price
+    line.set_product_group_data(subGroupData);
+    logger.debug("_addSubGroupToOrder - product_sub_group_id:", line.product_sub_group_id, "price:", line.get_unit_price());
     
-    // Ensure price_type is set to manual (CRITICAL for price locking)
-    if (line.price_type !== "manual") {
-        console.log("Framar Product Groups: Force setting price_type to manual");
-        line.price_type = "manual";
+    this.numberBuffer.reset();
+    return line;
+};
+
+// Rows of the one-tap selling strip, see ProductGroupStore.getTiles
+PosStore.prototype.getProductGroupTiles = function(formatPrice) {
+    return this.productGroupStore ? this.productGroupStore.getTiles(formatPrice) : [];
+};
+
+// Add the sub group of a tile of the one-tap strip: one tap, no popup
+PosStore.prototype.addProductGroupTile = async function(row, tile) {
+    const tappedAt = performance.now();
+    const product = this.db.get_product_by_id(row.productId);
+    if (!product) {
+        logger.error("Product of product group", row.groupId, "not loaded");
+        return;
     }
-    
-    // Ensure price is locked
-    if (!line._price_locked) {
-        line._price_locked = true;
+    // The tile picked the sub group: the keys typed next edit the new line
+    this.activeProductGroupId = null;
+    const line = await this._addSubGroupToOrder(product, tile.subGroup);
+    if (line) {
+        this._recordProductGroupTapToLine("one_tap", tappedAt, 1);
     }
-    
-    // Verify price is correct
-    const currentPrice = line.get_unit_price ? line.get_unit_price() : line.price;
-    if (Math.abs(parseFloat(currentPrice) - parseFloat(price)) > 0.01) {
-        console.log("Framar Product Groups: Price mismatch detected! Setting price from", currentPrice, "to", price);
-        line.set_unit_price(price);
-        // Verify again after setting
-        const newPrice = line.get_unit_price ? line.get_unit_price() : line.price;
-        console.log("Framar Product Groups: Price after correction:", newPrice);
-    } else {
-        console.log("Framar Product Groups: ✓ Price is correct:", currentPrice);
+};
+
+// Time from the tap on the group (popup) or tile (one tap) to the order line.
+// The popup figure includes the time the cashier takes to choose, which is
+// the point of the comparison: see getProductGroupTapStats().
+PosStore.prototype._recordProductGroupTapToLine = function(mode, tappedAt, taps) {
+    const elapsed = performance.now() - tappedAt;
+    performance.measure?.(`pos_product_groups:tap_to_line:${mode}`, { start: tappedAt, duration: elapsed });
+    this.productGroupTapStats = this.productGroupTapStats || {};
+    const stats = (this.productGroupTapStats[mode] = this.productGroupTapStats[mode] || { lines: 0, taps: 0, total_ms: 0 });
+    stats.lines += 1;
+    stats.taps += taps;
+    stats.total_ms += elapsed;
+    logger.debug(`Tap to line (${mode}): ${elapsed.toFixed(1)} ms, ${taps} tap(s)`);
+};
+
+// Average taps and milliseconds per combo line of each selling mode since the register was opened
+PosStore.prototype.getProductGroupTapStats = function() {
+    const result = {};
+    for (const [mode, stats] of Object.entries(this.productGroupTapStats || {})) {
+        result[mode] = {
+            lines: stats.lines,
+            taps_per_line: stats.taps / stats.lines,
+            ms_per_line: stats.total_ms / stats.lines,
+        };
     }
-    
-    // CRITICAL: Ensure sub-group data will be exported (even if patch method wasn't available)
-    // Verify the data is set
-    console.log("Framar Product Groups: Final check - product_sub_group_id:", line.product_sub_group_id, "price:", line.price, "price_type:", line.price_type);
-    
-    this.numberBuffer.reset();
+    return result;
 };
 
-console.log("Framar Product Groups: Patch applied to PosStore.prototype.addProductToCurrentOrder");
+logger.debug("Patch applied to PosStore.prototype.addProductToCurrentOrder");
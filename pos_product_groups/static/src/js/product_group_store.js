@@ -0,0 +1,213 @@
+/** @odoo-module **/
+
+/**
+ * In-memory index of the product group catalog loaded with the session.
+ *
+ * Built once at load time so that every lookup done while selling (tap on a
+ * combo tile, popup, orderline rehydration) is a Map access:
+ * - groups by id,
+ * - groups by the id of their POS product,
+ * - sub groups by id (sorted by sequence then price inside their group).
+ *
+ * The one-tap selling strip (`getTiles`) is derived from the same tree once
+ * per catalog load, with its prices already formatted.
+ *
+ * Components are not part of the catalog (combos are expanded server side);
+ * `getComponents` fetches them per sub group when they are shown and keeps
+ * the last `COMPONENT_CACHE_SIZE` answers.
+ */
+const COMPONENT_CACHE_SIZE = 50;
+
+export class ProductGroupStore {
+    constructor(productGroups = [], db = null) {
+        this.componentCache = new Map();
+        this.load(productGroups, db);
+    }
+
+    load(productGroups, db) {
+        this.groups = productGroups;
+        this.groupsById = new Map();
+        this.groupsByProductId = new Map();
+        this.productIdsByGroupId = new Map();
+        this.subGroupsById = new Map();
+        this.tiles = null;
+
+        for (const group of productGroups) {
+            group.sub_groups = (group.sub_groups || []).sort(
+                (a, b) => (a.sequence || 10) - (b.sequence || 10) || (a.price || 0) - (b.price || 0)
+            );
+            this.groupsById.set(group.id, group);
+            for (const subGroup of group.sub_groups) {
+                subGroup.product_group_id = group.id;
+                subGroup.product_group_name = group.name;
+                // Catalogs cached on the device by older versions still carry components
+                delete subGroup.components;
+                this.subGroupsById.set(subGroup.id, subGroup);
+            }
+        }
+
+        if (db) {
+            for (const product of Object.values(db.product_by_id || {})) {
+                if (product.is_product_group) {
+                    const group = this.groupsById.get(normalizeId(product.product_group_id));
+                    if (group) {
+                        this.groupsByProductId.set(product.id, group);
+                        this.productIdsByGroupId.set(group.id, product.id);
+                    }
+                }
+            }
+        }
+    }
+
+    /**
+     * Apply a catalog delta from `product.group.get_pos_catalog_delta` in place:
+     * changed records are upserted into the loaded tree, records that are no
+     * longer alive (deleted or deactivated) are dropped, then the indexes are
+     * rebuilt. Any catalog change may concern components, so the component
+     * cache is cleared.
+     */
+    applyDelta(delta, db) {
+        const aliveGroupIds = new Set(delta.group_ids);
+        const aliveSubGroupIds = new Set(delta.sub_group_ids);
+        this.componentCache.clear();
+
+        for (const { active, ...data } of delta.groups || []) {
+            const group = this.groupsById.get(data.id);
+            if (group) {
+                Object.assign(group, data);
+            } else if (active && aliveGroupIds.has(data.id)) {
+                const newGroup = { ...data, sub_groups: [] };
+                this.groups.push(newGroup);
+                this.groupsById.set(newGroup.id, newGroup);
+            }
+        }
+
+        for (const { active, ...data } of delta.sub_groups || []) {
+            const groupId = normalizeId(data.product_group_id);
+            let subGroup = this.subGroupsById.get(data.id);
+            if (subGroup) {
+                const previousGroup = this.groupsById.get(subGroup.product_group_id);
+                if (previousGroup && previousGroup.id !== groupId) {
+                    retainInPlace(previousGroup.sub_groups, (sg) => sg !== subGroup);
+                }
+                Object.assign(subGroup, data, { product_group_id: groupId });
+            } else if (active && aliveSubGroupIds.has(data.id)) {
+                subGroup = { ...data, product_group_id: groupId };
+                this.subGroupsById.set(subGroup.id, subGroup);
+            }
+            const group = this.groupsById.get(groupId);
+            if (subGroup && group && !group.sub_groups.includes(subGroup)) {
+                group.sub_groups.push(subGroup);
+            }
+        }
+
+        retainInPlace(this.groups, (group) => aliveGroupIds.has(group.id));
+        for (const group of this.groups) {
+            retainInPlace(group.sub_groups, (subGroup) => aliveSubGroupIds.has(subGroup.id));
+        }
+        this.load(this.groups, db);
+    }
+
+    /**
+     * Plain copy of the catalog tree, suitable for structured cloning into
+     * the browser storage.
+     */
+    serialize() {
+        return this.groups.map((group) => ({
+            ...group,
+            sub_groups: group.sub_groups.map((subGroup) => ({ ...subGroup })),
+        }));
+    }
+
+    /**
+     * Return the components (`{product_id, name, quantity}`) of a sub group,
+     * fetched from the server on first use and then kept in a small LRU.
+     */
+    async getComponents(subGroupId, orm) {
+        const cached = this.componentCache.get(subGroupId);
+        if (cached) {
+            // Move to the most recently used end
+            this.componentCache.delete(subGroupId);
+            this.componentCache.set(subGroupId, cached);
+            return cached;
+        }
+        const result = await orm.call("product.group.sub", "get_pos_combo_components", [[subGroupId]]);
+        const components = result[subGroupId] || [];
+        this.componentCache.set(subGroupId, components);
+        if (this.componentCache.size > COMPONENT_CACHE_SIZE) {
+            this.componentCache.delete(this.componentCache.keys().next().value);
+        }
+        return components;
+    }
+
+    /**
+     * Rows of the one-tap selling strip, one per group sold in the POS:
+     * `{groupId, productId, name, tiles: [{subGroup, key, label, price}]}`,
+     * `key` being the number key (1-9) selecting the tile. Built on first use
+     * after each (re)load of the catalog, so rendering the strip does no
+     * sorting nor price formatting.
+     */
+    getTiles(formatPrice) {
+        if (!this.tiles) {
+            this.tiles = [];
+            for (const group of this.groups) {
+                const productId = this.productIdsByGroupId.get(group.id);
+                if (!productId || !group.sub_groups.length) {
+                    continue;
+                }
+                this.tiles.push({
+                    groupId: group.id,
+                    productId,
+                    name: group.name,
+                    tiles: group.sub_groups.map((subGroup, index) => ({
+                        subGroup,
+                        key: index < 9 ? String(index + 1) : null,
+                        label: subGroup.name,
+                        price: formatPrice(subGroup.price || 0),
+                    })),
+                });
+            }
+        }
+        return this.tiles;
+    }
+
+    getGroup(groupId) {
+        return this.groupsById.get(groupId);
+    }
+
+    getGroupForProduct(product) {
+        return product ? this.groupsByProductId.get(product.id) : undefined;
+    }
+
+    getSubGroup(subGroupId) {
+        return this.subGroupsById.get(subGroupId);
+    }
+}
+
+/**
+ * Remove in place the items of `array` that do not match `predicate`, so that
+ * references to the array held elsewhere see the change.
+ */
+function retainInPlace(array, predicate) {
+    let kept = 0;
+    for (const item of array) {
+        if (predicate(item)) {
+            array[kept++] = item;
+        }
+    }
+    array.length = kept;
+}
+
+/**
+ * Many2one values come as `[id, name]`, `{id}` or a plain id depending on
+ * where they were read from.
+ */
+export function normalizeId(value) {
+    if (!value) {
+        return null;
+    }
+    if (Array.isArray(value)) {
+        return value[0];
+    }
+    return value.id || value;
+}
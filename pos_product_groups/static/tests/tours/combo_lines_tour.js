@@ -0,0 +1,128 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import * as ProductScreen from "@point_of_sale/../tests/tours/helpers/ProductScreenTourMethods";
+import { logger } from "@pos_product_groups/js/logger";
+import { assert, asyncSteps, getComboGroup, getPos, waitFor } from "./utils";
+
+const LINE_COUNT = 50;
+// Loose on purpose: catches a render cost per line gone wrong, not noise
+const RENDER_BUDGET_MS = 3000;
+
+/**
+ * Add LINE_COUNT sub group lines (no merging) to a new order and wait for
+ * them to be rendered, counting the console output meanwhile.
+ */
+async function renderComboLines() {
+    const pos = getPos();
+    const { product, subGroups } = getComboGroup(pos, "Tour Rolex");
+    pos.add_new_order();
+    const methods = ["log", "debug", "info"];
+    const originals = Object.fromEntries(methods.map((method) => [method, console[method]]));
+    let consoleCalls = 0;
+    for (const method of methods) {
+        console[method] = (...args) => {
+            consoleCalls++;
+            originals[method].apply(console, args);
+        };
+    }
+    const startedAt = performance.now();
+    try {
+        for (let index = 0; index < LINE_COUNT; index++) {
+            await pos._addSubGroupToOrder(product, subGroups[index % subGroups.length], { merge: false });
+        }
+        await waitFor(() => document.querySelectorAll(".order-container .orderline").length >= LINE_COUNT);
+    } finally {
+        Object.assign(console, originals);
+    }
+    return {
+        lines: pos.get_order().get_orderlines().length,
+        renderedLines: document.querySelectorAll(".order-container .orderline").length,
+        ms: performance.now() - startedAt,
+        consoleCalls,
+        debugEnabled: logger.debugEnabled,
+    };
+}
+
+/**
+ * Change the quantity of every line of the current order, counting the
+ * timers scheduled and checking the locked price is kept.
+ */
+async function editComboQuantities() {
+    const pos = getPos();
+    const lines = pos.get_order().get_orderlines();
+    const originalSetTimeout = window.setTimeout;
+    let timers = 0;
+    window.setTimeout = function () {
+        timers++;
+        return originalSetTimeout.apply(this, arguments);
+    };
+    const startedAt = performance.now();
+    let priceChanges = 0;
+    try {
+        for (const line of lines) {
+            const price = line.get_unit_price();
+            line.set_quantity(3);
+            if (line.get_unit_price() !== price) {
+                priceChanges++;
+            }
+        }
+    } finally {
+        window.setTimeout = originalSetTimeout;
+    }
+    return {
+        edits: lines.length,
+        timersPerEdit: timers / lines.length,
+        msPerEdit: (performance.now() - startedAt) / lines.length,
+        priceChanges,
+    };
+}
+
+/**
+ * Sell the free sub group of "Tour Promo" twice and export the order: a 0
+ * price is a price, it must be locked like any other.
+ */
+async function sellFreeSubGroup() {
+    const pos = getPos();
+    const { product, subGroups } = getComboGroup(pos, "Tour Promo");
+    pos.add_new_order();
+    const line = await pos._addSubGroupToOrder(product, subGroups[0]);
+    await pos._addSubGroupToOrder(product, subGroups[0]);
+    line.set_quantity(3);
+    const [, , exported] = pos.get_order().export_as_JSON().lines[0];
+    return {
+        lines: pos.get_order().get_orderlines().length,
+        lockedPrice: line.get_locked_price(),
+        unitPrice: line.get_unit_price(),
+        exportedPrice: exported.price_unit,
+    };
+}
+
+registry.category("web_tour.tours").add("ProductGroupsComboLinesTour", {
+    test: true,
+    url: "/pos/ui",
+    steps: () =>
+        [
+            ProductScreen.confirmOpeningPopup(),
+            asyncSteps("combo_lines_render", renderComboLines, (result) => {
+                assert(result.lines === LINE_COUNT, `${result.lines} lines instead of ${LINE_COUNT}`);
+                assert(result.renderedLines === LINE_COUNT, `${result.renderedLines} lines rendered`);
+                assert(result.ms < RENDER_BUDGET_MS, `Rendering took ${result.ms} ms`);
+                // Outside debug the module logs nothing while selling
+                assert(result.debugEnabled || result.consoleCalls === 0, `${result.consoleCalls} console calls`);
+            }),
+            asyncSteps("combo_quantity_edits", editComboQuantities, (result) => {
+                assert(result.edits === LINE_COUNT, `${result.edits} quantity edits`);
+                // The price lock is declarative: no timer per edit
+                assert(result.timersPerEdit === 0, `${result.timersPerEdit} timers per quantity edit`);
+                assert(result.priceChanges === 0, `${result.priceChanges} locked prices changed`);
+            }),
+            asyncSteps("combo_free_sub_group", sellFreeSubGroup, (result) => {
+                // Selected twice: merged into one line, which needs the lock
+                assert(result.lines === 1, `${result.lines} lines for one free sub group`);
+                assert(result.lockedPrice === 0, `Free sub group locked at ${result.lockedPrice}`);
+                assert(result.unitPrice === 0 && result.exportedPrice === 0,
+                    `Free sub group sold at ${result.unitPrice}, exported at ${result.exportedPrice}`);
+            }),
+        ].flat(),
+});
@@ -0,0 +1,74 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import * as ProductScreen from "@point_of_sale/../tests/tours/helpers/ProductScreenTourMethods";
+import { assert, asyncSteps, getComboGroup, getPos } from "./utils";
+
+const ORDER_COUNT = 100;
+
+/**
+ * Sell ORDER_COUNT combo orders, rebuild each one from its JSON like the
+ * device order cache does (init_from_JSON), edit the quantities of the rebuilt
+ * lines and synchronize the re-exported orders as drafts.
+ */
+async function restoreComboOrders() {
+    const pos = getPos();
+    const { product, subGroups } = getComboGroup(pos, "Tour Rolex");
+    const exported = [];
+    for (let index = 0; index < ORDER_COUNT; index++) {
+        pos.add_new_order();
+        for (const subGroup of subGroups) {
+            await pos._addSubGroupToOrder(product, subGroup, { merge: false });
+        }
+        exported.push(pos.get_order().export_as_JSON());
+    }
+
+    const subGroupPrices = new Map(subGroups.map((subGroup) => [subGroup.id, subGroup.price]));
+    const restored = [];
+    const mismatches = [];
+    for (const json of exported) {
+        const order = pos.createReactiveOrder(JSON.parse(JSON.stringify(json)));
+        for (const line of order.get_orderlines()) {
+            line.set_quantity(2);
+        }
+        const restoredJson = order.export_as_JSON();
+        restoredJson.lines.forEach(([, , line], index) => {
+            const sold = json.lines[index][2];
+            if (
+                !line.combo
+                || line.combo[0] !== sold.combo[0]
+                || line.price_unit !== sold.price_unit
+                || line.price_unit !== subGroupPrices.get(line.combo[0])
+            ) {
+                mismatches.push({ order: json.uid, sold: [sold.combo, sold.price_unit], restored: [line.combo, line.price_unit] });
+            }
+        });
+        restored.push(restoredJson);
+    }
+
+    await pos.orm.call("pos.order", "create_from_ui", [
+        restored.map((json) => ({ id: json.uid, data: json, to_invoice: false })),
+        true,
+    ]);
+    return {
+        orders: restored.length,
+        lines: restored.reduce((count, json) => count + json.lines.length, 0),
+        mismatches: mismatches.slice(0, 5),
+        mismatchCount: mismatches.length,
+    };
+}
+
+registry.category("web_tour.tours").add("ProductGroupsRestoreTour", {
+    test: true,
+    url: "/pos/ui",
+    steps: () =>
+        [
+            ProductScreen.confirmOpeningPopup(),
+            asyncSteps("combo_orders_restore", restoreComboOrders, (result) => {
+                assert(result.orders === ORDER_COUNT, `${result.orders} orders restored`);
+                assert(result.lines > 0, "No combo line restored");
+                // Every restored line keeps its sub group and its locked price
+                assert(result.mismatchCount === 0, `${result.mismatchCount} lines restored differently: ${JSON.stringify(result.mismatches)}`);
+            }),
+        ].flat(),
+});
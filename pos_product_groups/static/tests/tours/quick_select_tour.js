@@ -0,0 +1,79 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import * as ProductScreen from "@point_of_sale/../tests/tours/helpers/ProductScreenTourMethods";
+import { assert, asyncSteps, getComboGroup, getPos, waitFor } from "./utils";
+
+function typeKey(key) {
+    document.body.dispatchEvent(new KeyboardEvent("keyup", { key, bubbles: true }));
+}
+
+function selectedQuantity(pos) {
+    return pos.get_order().get_selected_orderline()?.get_quantity();
+}
+
+/**
+ * Sell "Tour Rolex" from the one-tap strip, then type quantities: after a
+ * tile tap, and after a number key selected a tile of the armed row, the
+ * digits typed next must set the quantity of the line instead of adding
+ * another tile.
+ */
+async function typeQuantityAfterQuickSelect() {
+    const pos = getPos();
+    const { product, subGroups } = getComboGroup(pos, "Tour Rolex");
+    pos.add_new_order();
+    const order = pos.get_order();
+    const row = [...document.querySelectorAll(".product-group-quick-select > div")].find(
+        (row) => row.querySelector("span").textContent.trim() === "Tour Rolex"
+    );
+    assert(row, "No one-tap row for Tour Rolex");
+
+    // Tap the first tile, then type a quantity
+    row.querySelector("button").click();
+    await waitFor(() => order.get_orderlines().length === 1);
+    typeKey("2");
+    await waitFor(() => selectedQuantity(pos) === 2);
+    const afterTile = { lines: order.get_orderlines().length, armed: pos.activeProductGroupId || null };
+
+    // Tap the group product, select the second tile with its key, then type a quantity
+    await pos.addProductToCurrentOrder(product);
+    typeKey("2");
+    await waitFor(() => order.get_orderlines().length === 2);
+    typeKey("3");
+    await waitFor(() => selectedQuantity(pos) === 3);
+
+    const afterKey = order.get_orderlines().map((line) => [line.product_sub_group_id, line.get_quantity()]);
+
+    // Escape disarms the row as well: the next digit is left to the number buffer
+    await pos.addProductToCurrentOrder(product);
+    typeKey("Escape");
+    const armedAfterEscape = pos.activeProductGroupId || null;
+    typeKey("1");
+    await waitFor(() => selectedQuantity(pos) !== 3);
+    return {
+        afterTile,
+        afterKey,
+        expected: [[subGroups[0].id, 2], [subGroups[1].id, 3]],
+        armedAfterEscape,
+        lines: order.get_orderlines().length,
+    };
+}
+
+registry.category("web_tour.tours").add("ProductGroupsQuickSelectTour", {
+    test: true,
+    url: "/pos/ui",
+    steps: () =>
+        [
+            ProductScreen.confirmOpeningPopup(),
+            asyncSteps("combo_quick_select", typeQuantityAfterQuickSelect, (result) => {
+                assert(result.afterTile.lines === 1, `${result.afterTile.lines} lines after typing a quantity`);
+                assert(!result.afterTile.armed, "The tile tap left the row armed");
+                assert(
+                    JSON.stringify(result.afterKey) === JSON.stringify(result.expected),
+                    `Lines ${JSON.stringify(result.afterKey)}, expected ${JSON.stringify(result.expected)}`
+                );
+                assert(!result.armedAfterEscape, "Escape left the row armed");
+                assert(result.lines === 2, `${result.lines} lines after typing a digit past Escape`);
+            }),
+        ].flat(),
+});
@@ -0,0 +1,80 @@
+/** @odoo-module **/
+
+export function getPos() {
+    return window.posmodel || odoo.__WOWL_DEBUG__.root.env.services.pos;
+}
+
+/**
+ * Return the POS product and the sub groups of the product group `name`.
+ */
+export function getComboGroup(pos, name) {
+    const group = pos.productGroupStore.groups.find((group) => group.name === name);
+    if (!group) {
+        throw new Error(`Product group ${name} is not loaded`);
+    }
+    const product = pos.db.get_product_by_id(pos.productGroupStore.productIdsByGroupId.get(group.id));
+    return { group, product, subGroups: group.sub_groups };
+}
+
+/**
+ * Resolve once `predicate()` is true, checked on every animation frame.
+ */
+export function waitFor(predicate, timeout = 10000) {
+    const startedAt = performance.now();
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            if (predicate()) {
+                resolve();
+            } else if (performance.now() - startedAt > timeout) {
+                reject(new Error("Timeout"));
+            } else {
+                requestAnimationFrame(check);
+            }
+        };
+        check();
+    });
+}
+
+const results = {};
+
+/**
+ * Steps running the async `callback` then checking its result with `check`:
+ * the first step starts it and flags the body when it settles, the second one
+ * waits for the flag, so the tour never depends on the step runner awaiting
+ * promises.
+ */
+export function asyncSteps(name, callback, check) {
+    return [
+        {
+            content: `Run ${name}`,
+            trigger: ".pos .product-screen",
+            run: () => {
+                Promise.resolve()
+                    .then(callback)
+                    .then(
+                        (result) => (results[name] = { result }),
+                        (error) => (results[name] = { error })
+                    )
+                    .then(() => document.body.classList.add(`o_${name}_done`));
+            },
+        },
+        {
+            content: `Check ${name}`,
+            trigger: `body.o_${name}_done`,
+            run: () => {
+                const { result, error } = results[name];
+                if (error) {
+                    throw error;
+                }
+                console.info(`${name}:`, JSON.stringify(result));
+                check(result);
+            },
+        },
+    ];
+}
+
+export function assert(condition, message) {
+    if (!condition) {
+        throw new Error(message);
+    }
+}
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+from . import test_combo_benchmark
+from . import test_combo_indexes
+from . import test_frontend
+from . import test_pos_order
+from . import test_product_group
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+from odoo import Command
+
+# (name, list price, quantity in each sub group)
+COMPONENTS = (('Chapati', 500.0, 1.0), ('Egg', 300.0, 2.0), ('Tomato', 200.0, 1.0))
+
+
+def create_combo_catalog(env, name='Test Rolex', prices=(1000.0, 1500.0)):
+    """Create a group ``name`` with one sub group per price, each made of ``COMPONENTS``.
+
+    :return: (group, sub groups, component products)
+    """
+    components = env['product.product'].create([{
+        'name': f'{name} {component}',
+        'type': 'product',
+        'list_price': list_price,
+    } for component, list_price, _quantity in COMPONENTS])
+    group = env['product.group'].create({'name': name})
+    sub_groups = env['product.group.sub'].create([{
+        'name': f'{name} {price:g}',
+        'price': price,
+        'sequence': sequence,
+        'product_group_id': group.id,
+        'component_ids': [
+            Command.create({'product_id': product.id, 'quantity': quantity, 'sequence': index})
+            for index, (product, (_name, _price, quantity)) in enumerate(zip(components, COMPONENTS))
+        ],
+    } for sequence, price in enumerate(prices)])
+    return group, sub_groups, components
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+import tracemalloc
+import uuid
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.addons.point_of_sale.tests.common import TestPoSCommon
+
+from odoo.addons.pos_product_groups.models import combo_recipe
+
+_logger = logging.getLogger(__name__)
+
+# Size of the synthetic catalog: groups × sub groups, each sub group made of
+# COMPONENTS of the COMPONENTS * 10 component products
+GROUPS = 50
+SUB_GROUPS = 5
+COMPONENTS = 6
+
+LINE_COUNTS = (1, 10, 50, 200)
+ORDERS_PER_SCENARIO = 10
+# Share of the lines that are sub group lines
+COMBO_RATIO = 0.5
+SEED = 42
+
+# Query budgets of the scenarios. The prefetch is constant whatever the number
+# of orders and lines. create_from_ui gets a base per order plus
+# QUERIES_PER_LINE per line sent, so that a query per line (N+1) exceeds it
+# as soon as the orders have a few lines.
+QUERIES_PREFETCH_COLD = 12
+QUERIES_PREFETCH_WARM = 1
+QUERIES_PER_ORDER = 100
+QUERIES_PER_ORDER_PARTIAL_FAILURE = 130
+QUERIES_PER_LINE = 0.5
+# Allocation peak of the expansion, in KiB per line
+PEAK_KIB_PER_EXPANDED_LINE = 16
+
+# Share of the orders of the partial failure scenario carrying a corrupt
+# sub group line (no unit price), which makes their expansion fail
+FAILURE_RATIO = 0.1
+
+# Share of the sub group lines sent without sub group (older registers),
+# resolved by the price fallback
+FALLBACK_RATIO = 0.1
+
+
+@tagged('post_install', '-at_install', '-standard', 'combo_benchmark')
+class TestComboBenchmark(TestPoSCommon):
+    """Query budgets of the combo order ingestion.
+
+    Runs on a synthetic catalog with its own POS config and session, and a
+    private recipe cache. The durations are only logged: the budgets catch
+    complexity regressions (a query or an ORM call per line), not noise.
+    Left out of the standard test runs, select it explicitly::
+
+        odoo-bin -d <db> -u pos_product_groups --test-tags combo_benchmark --stop-after-init
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.config = cls.basic_config
+        cls.plain_products, cls.combo_products = cls._create_benchmark_catalog(random.Random(SEED))
+
+    def setUp(self):
+        super().setUp()
+        self.rng = random.Random(SEED)
+        self.cache = self.enterContext(combo_recipe.isolated_cache(self.env.cr))
+        self.open_new_session()
+
+    @classmethod
+    def _create_benchmark_catalog(cls, rng):
+        """Create the synthetic catalog, return the plain products and the (product, sub group) pairs"""
+        products = cls.env['product.product'].create([{
+            'name': f'Benchmark Component {index}',
+            'default_code': f'BENCH-COMP-{index}',
+            'list_price': rng.choice([200.0, 500.0, 1000.0, 1500.0]),
+            'available_in_pos': True,
+        } for index in range(COMPONENTS * 10)])
+        rows = []
+        for group_index in range(GROUPS):
+            for sub_group_index in range(SUB_GROUPS):
+                for product in rng.sample(list(products), COMPONENTS):
+                    rows.append({
+                        'group': f'Benchmark Group {group_index}',
+                        'sub_group': f'Benchmark Group {group_index} - {sub_group_index}',
+                        'price': 1000.0 * (sub_group_index + 1),
+                        'sequence': sub_group_index,
+                        'component': product.default_code,
+                        'quantity': rng.choice([1.0, 1.0, 2.0]),
+                    })
+        cls.env['product.group']._import_catalog_rows(rows)
+        product_groups = cls.env['product.group'].search([('name', '=like', 'Benchmark Group %')])
+        cls.env.flush_all()
+        return list(products), [
+            (group.product_template_id.product_variant_id, sub_group)
+            for group in product_groups for sub_group in group.sub_group_ids
+        ]
+
+    def _benchmark_orders(self, line_count, order_count=ORDERS_PER_SCENARIO, failure_ratio=0.0,
+                          fallback_ratio=FALLBACK_RATIO):
+        """Return ``order_count`` synthetic UI orders in the ``create_from_ui`` format"""
+        rng = self.rng
+        version = combo_recipe.get_catalog_version(self.env.cr)
+        orders = []
+        for _index in range(order_count):
+            order_uid = str(uuid.uuid4())
+            lines = []
+            for _line_index in range(line_count):
+                line = {
+                    'qty': rng.choice([1, 1, 2, 3]),
+                    'discount': 0.0,
+                    'tax_ids': [[6, False, []]],
+                    'pack_lot_ids': [],
+                    'price_extra': 0.0,
+                    'uuid': str(uuid.uuid4()),
+                }
+                if rng.random() < COMBO_RATIO:
+                    product, sub_group = rng.choice(self.combo_products)
+                    line.update(product_id=product.id, price_unit=sub_group.price, full_product_name=sub_group.name)
+                    # Leave some lines to the price fallback
+                    if rng.random() >= fallback_ratio:
+                        line['combo'] = [sub_group.id, version]
+                else:
+                    product = rng.choice(self.plain_products)
+                    line.update(product_id=product.id, price_unit=product.list_price, full_product_name=product.name)
+                line['price_subtotal'] = line['price_subtotal_incl'] = line['price_unit'] * line['qty']
+                lines.append([0, 0, line])
+            if rng.random() < failure_ratio:
+                product, sub_group = rng.choice(self.combo_products)
+                lines.append([0, 0, {
+                    'qty': 1, 'discount': 0.0, 'tax_ids': [[6, False, []]], 'pack_lot_ids': [],
+                    'product_id': product.id, 'price_unit': None, 'price_subtotal': 0.0,
+                    'price_subtotal_incl': 0.0, 'combo': [sub_group.id, version], 'uuid': str(uuid.uuid4()),
+                }])
+            orders.append({'id': order_uid, 'to_invoice': False, 'data': {
+                'name': f'Order {order_uid}',
+                'uid': order_uid,
+                'sequence_number': 1,
+                'pos_session_id': self.pos_session.id,
+                'pricelist_id': self.config.pricelist_id.id,
+                'user_id': self.env.uid,
+                'partner_id': False,
+                'fiscal_position_id': False,
+                'creation_date': fields.Datetime.to_string(fields.Datetime.now()),
+                'amount_total': sum(line[2]['price_subtotal_incl'] for line in lines),
+                'amount_tax': 0.0,
+                'amount_paid': 0.0,
+                'amount_return': 0.0,
+                'lines': lines,
+                'statement_ids': [],
+                'to_invoice': False,
+            }})
+        return orders
+
+    def assertScenarioQueries(self, name, call, queries):
+        """Run ``call()`` within ``queries`` queries and log its duration"""
+        self.env.flush_all()
+        started_at = time.perf_counter()
+        with self.assertQueryCount(queries):
+            call()
+        _logger.info("Combo benchmark %s: %.1f ms", name, (time.perf_counter() - started_at) * 1000)
+
+    def _create_from_ui_budget(self, orders, queries_per_order):
+        lines = sum(len(order['data']['lines']) for order in orders)
+        return int(queries_per_order * len(orders) + QUERIES_PER_LINE * lines)
+
+    def test_prefetch(self):
+        PosOrder = self.env['pos.order']
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                ui_orders = [order['data'] for order in self._benchmark_orders(line_count)]
+                self.cache.discard(list(self.cache.entries))
+                self.cache.drop_price_index()
+                self.assertScenarioQueries(
+                    f'prefetch_cold ({line_count} lines)',
+                    lambda: PosOrder._prefetch_combo_data(ui_orders), QUERIES_PREFETCH_COLD)
+                self.assertScenarioQueries(
+                    f'prefetch_warm ({line_count} lines)',
+                    lambda: PosOrder._prefetch_combo_data(ui_orders), QUERIES_PREFETCH_WARM)
+
+    def test_expand(self):
+        PosOrder = self.env['pos.order']
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                ui_orders = [order['data'] for order in self._benchmark_orders(line_count)]
+                combo_data = PosOrder._prefetch_combo_data(ui_orders)
+
+                def expand():
+                    for ui_order in ui_orders:
+                        PosOrder._expand_combo_lines(ui_order, combo_data)
+                self.assertScenarioQueries(f'expand ({line_count} lines)', expand, 0)
+
+                tracemalloc.start()
+                try:
+                    expand()
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                self.assertLessEqual(peak / 1024 / (line_count * len(ui_orders)), PEAK_KIB_PER_EXPANDED_LINE)
+
+    def test_create_from_ui(self):
+        PosOrder = self.env['pos.order']
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                orders = self._benchmark_orders(line_count)
+                self.assertScenarioQueries(
+                    f'create_from_ui ({line_count} lines)',
+                    lambda: PosOrder.create_from_ui(orders, draft=True),
+                    self._create_from_ui_budget(orders, QUERIES_PER_ORDER))
+
+    def test_create_from_ui_partial_failure(self):
+        """The orders failing to expand are quarantined without costing the batch its budget"""
+        PosOrder = self.env['pos.order']
+        for line_count in LINE_COUNTS:
+            with self.subTest(lines=line_count):
+                orders = self._benchmark_orders(line_count, failure_ratio=FAILURE_RATIO)
+                self.assertScenarioQueries(
+                    f'create_from_ui_partial_failure ({line_count} lines)',
+                    lambda: PosOrder.create_from_ui(orders, draft=True),
+                    self._create_from_ui_budget(orders, QUERIES_PER_ORDER_PARTIAL_FAILURE))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+from .common import create_combo_catalog
+
+
+@tagged('post_install', '-at_install')
+class TestComboIndexes(TransactionCase):
+    """The combo lookups can be served by their index.
+
+    Sequential scans are disabled for the EXPLAIN so that the plan shows
+    whether an index *can* serve the lookup, even on a test database too small
+    for the planner to prefer it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group, cls.sub_groups, _components = create_combo_catalog(cls.env, name='Index Rolex')
+        cls.env.flush_all()
+
+    def assertIndexUsed(self, index_name, query, params):
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+        try:
+            self.env.cr.execute(f"EXPLAIN {query}", params)
+            plan = '\n'.join(row[0] for row in self.env.cr.fetchall())
+        finally:
+            self.env.cr.execute("RESET enable_seqscan")
+        self.assertIn(index_name, plan)
+
+    def test_order_line_sub_group_lookup(self):
+        self.assertIndexUsed(
+            'pos_order_line__product_sub_group_id_index',
+            "SELECT id FROM pos_order_line WHERE product_sub_group_id = %s",
+            [self.sub_groups[0].id],
+        )
+
+    def test_group_product_lookup(self):
+        self.assertIndexUsed(
+            'product_product__product_group_id_index',
+            "SELECT id FROM product_product WHERE is_product_group IS TRUE AND product_group_id = %s",
+            [self.group.id],
+        )
+
+    def test_sub_group_product_lookup(self):
+        self.assertIndexUsed(
+            'product_product__product_sub_group_id_index',
+            "SELECT id FROM product_product WHERE is_product_sub_group IS TRUE AND product_sub_group_id = %s",
+            [self.sub_groups[0].id],
+        )
+
+    def test_no_duplicate_product_indexes(self):
+        """product.product has a single index on each group many2one"""
+        self.env.cr.execute("""
+            SELECT indexname FROM pg_indexes
+             WHERE tablename = 'product_product'
+               AND (indexdef LIKE '%%(product_group_id)%%' OR indexdef LIKE '%%(product_sub_group_id)%%')
+        """)
+        self.assertCountEqual(
+            [row[0] for row in self.env.cr.fetchall()],
+            ['product_product__product_group_id_index', 'product_product__product_sub_group_id_index'],
+        )
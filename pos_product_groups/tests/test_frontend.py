@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+from odoo.addons.point_of_sale.tests.test_frontend import TestPointOfSaleHttpCommon
+
+from odoo.addons.pos_product_groups.models import combo_metrics
+
+from .common import create_combo_catalog
+
+# Metrics counters of the price fallback, see pos.order._resolve_combo_sub_group_id
+FALLBACK_COUNTERS = ('fallback_hits', 'fallback_ambiguous', 'fallback_misses')
+
+
+@tagged('post_install', '-at_install')
+class TestProductGroupsFrontend(TestPointOfSaleHttpCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group, cls.sub_groups, cls.components = create_combo_catalog(cls.env, name='Tour Rolex')
+        # A free sub group of a group product with a list price, which the
+        # price lock must never fall back to
+        promo_group, _sub_groups, _components = create_combo_catalog(cls.env, name='Tour Promo', prices=(0.0,))
+        promo_group.product_template_id.list_price = 700.0
+
+    def _start_pos_tour(self, tour_name):
+        self.main_pos_config.with_user(self.pos_user).open_ui()
+        self.start_tour(f"/pos/ui?config_id={self.main_pos_config.id}", tour_name, login="pos_user")
+
+    def test_combo_lines_render(self):
+        """A 50 combo line order renders within budget, without console output outside debug,
+        and editing the quantity of its lines schedules no timer nor changes their price.
+        A free sub group is locked at 0 like any other price"""
+        self._start_pos_tour('ProductGroupsComboLinesTour')
+
+    def test_combo_orders_restore(self):
+        """Orders rebuilt from their JSON by the register (device order cache) are exported
+        with their sub group and locked price: their synchronization never goes through
+        the server side price matching"""
+        metrics = combo_metrics.get_metrics(self.env.cr.dbname)
+
+        def fallback_lookups():
+            counters = metrics.snapshot()['counters']
+            return sum(counters.get(name, 0) for name in FALLBACK_COUNTERS)
+
+        fallbacks_before = fallback_lookups()
+        self._start_pos_tour('ProductGroupsRestoreTour')
+        orders = self.env['pos.order'].search([('session_id', '=', self.main_pos_config.current_session_id.id)])
+        self.assertEqual(len(orders), 100)
+        self.assertEqual(set(orders.mapped('combo_expansion_state')), {'expanded'})
+        self.assertEqual(orders.lines.filtered('is_component').product_id, self.components)
+        self.assertEqual(fallback_lookups(), fallbacks_before)
+
+    def test_combo_quick_select_quantity(self):
+        """With the one-tap strip, the digits typed after a tile is selected set the
+        quantity of its line instead of adding another tile"""
+        self.main_pos_config.product_group_quick_select = True
+        self._start_pos_tour('ProductGroupsQuickSelectTour')
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import uuid
+from unittest.mock import patch
+
+from psycopg2.errors import SerializationFailure
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.addons.point_of_sale.tests.common import TestPoSCommon
+
+from odoo.addons.pos_product_groups.models import combo_recipe
+from odoo.addons.pos_product_groups.models.pos_order import SYNC_CHUNK_SIZE_PARAM, SYNC_COMMIT_CONTEXT_KEY
+
+from .common import create_combo_catalog
+
+
+@tagged('post_install', '-at_install')
+class TestComboOrders(TestPoSCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company.point_of_sale_update_stock_quantities = 'real'
+        cls.config = cls.basic_config
+        cls.group, cls.sub_groups, cls.components = create_combo_catalog(cls.env, name='Order Rolex')
+        cls.group_product = cls.group.product_template_id.product_variant_id
+
+    def setUp(self):
+        super().setUp()
+        self.open_new_session()
+
+    def _combo_line(self, sub_group, qty=1, price_unit=False):
+        """Return a sub group line in the compact wire format"""
+        price_unit = sub_group.price if price_unit is False else price_unit
+        return [0, 0, {
+            'product_id': self.group_product.id,
+            'qty': qty,
+            'price_unit': price_unit,
+            'discount': 0.0,
+            'tax_ids': [[6, False, []]],
+            'pack_lot_ids': [],
+            'full_product_name': sub_group.name,
+            'price_subtotal': (price_unit or 0.0) * qty,
+            'price_subtotal_incl': (price_unit or 0.0) * qty,
+            'uuid': str(uuid.uuid4()),
+            'combo': [sub_group.id, combo_recipe.get_catalog_version(self.env.cr)],
+        }]
+
+    def _ui_order(self, lines):
+        """Return a paid order in the ``create_from_ui`` format"""
+        order_uid = str(uuid.uuid4())
+        amount_total = sum(line[2]['price_subtotal_incl'] for line in lines)
+        return {'id': order_uid, 'to_invoice': False, 'data': {
+            'name': f'Order {order_uid}',
+            'uid': order_uid,
+            'sequence_number': 1,
+            'pos_session_id': self.pos_session.id,
+            'pricelist_id': self.config.pricelist_id.id,
+            'user_id': self.env.uid,
+            'partner_id': False,
+            'fiscal_position_id': False,
+            'creation_date': fields.Datetime.to_string(fields.Datetime.now()),
+            'amount_total': amount_total,
+            'amount_tax': 0.0,
+            'amount_paid': amount_total,
+            'amount_return': 0.0,
+            'lines': lines,
+            'statement_ids': [[0, 0, {
+                'name': fields.Datetime.now(),
+                'payment_method_id': self.cash_pm1.id,
+                'amount': amount_total,
+            }]],
+            'to_invoice': False,
+        }}
+
+    def _create_orders(self, ui_orders):
+        result = self.env['pos.order'].create_from_ui(ui_orders)
+        return self.env['pos.order'].browse([order['id'] for order in result])
+
+    def test_failed_order_picking(self):
+        """A quarantined order gets no picking until its expansion is retried successfully"""
+        # No unit price: the expansion fails and the order is stored as sold
+        order = self._create_orders([self._ui_order([
+            self._combo_line(self.sub_groups[0]),
+            self._combo_line(self.sub_groups[1], price_unit=None),
+        ])])
+        self.assertEqual(order.combo_expansion_state, 'failed')
+        self.assertFalse(order.picking_ids)
+
+        order.action_expand_combo_lines()
+        self.assertEqual(order.combo_expansion_state, 'expanded')
+        self.assertEqual(order.picking_ids.move_ids.product_id, self.components)
+
+    def _deleted_sub_group_line(self):
+        """Return a line sold with a sub group deleted since"""
+        sub_group = self.env['product.group.sub'].create({
+            'name': 'Order Rolex 2000', 'price': 2000.0, 'product_group_id': self.group.id,
+        })
+        line = self._combo_line(sub_group)
+        sub_group.unlink()
+        return line
+
+    def test_deleted_sub_group_expanded(self):
+        """A line of a deleted sub group is kept with its name, without the dangling id"""
+        order = self._create_orders([self._ui_order([
+            self._combo_line(self.sub_groups[0]),
+            self._deleted_sub_group_line(),
+        ])])
+        kept_line = order.lines.filtered(lambda line: line.product_sub_group_name == 'Order Rolex 2000')
+        self.assertTrue(kept_line)
+        self.assertFalse(kept_line.product_sub_group_id)
+        self.assertEqual(order.lines.filtered('is_component').product_id, self.components)
+
+    def test_deleted_sub_group_deferred(self):
+        """Deferred orders are stored whatever the sub groups deleted since they were sold"""
+        self.config.product_group_deferred_expansion = True
+        order = self._create_orders([self._ui_order([
+            self._combo_line(self.sub_groups[0]),
+            self._deleted_sub_group_line(),
+        ])])
+        self.assertEqual(order.combo_expansion_state, 'pending')
+        self.assertEqual(order.lines.product_sub_group_id, self.sub_groups[0])
+        self.assertIn('Order Rolex 2000', order.lines.mapped('product_sub_group_name'))
+
+    def test_sync_commit_chunks(self):
+        """Only the synchronization of the registers commits its batch by chunks"""
+        self.env['ir.config_parameter'].sudo().set_param(SYNC_CHUNK_SIZE_PARAM, 1)
+        ui_orders = [self._ui_order([self._combo_line(sub_group)]) for sub_group in self.sub_groups * 2]
+        PosOrder = self.env['pos.order']
+        with patch.object(type(self.env.cr), 'commit') as commit:
+            PosOrder.create_from_ui(ui_orders[:2])
+            commit.assert_not_called()
+            PosOrder.with_context(**{SYNC_COMMIT_CONTEXT_KEY: True}).create_from_ui(ui_orders[2:])
+        self.assertEqual(commit.call_count, 2)
+
+    def test_deferred_expansion_to_invoice(self):
+        """Orders to invoice are expanded right away, even with the deferred expansion"""
+        self.config.product_group_deferred_expansion = True
+        ui_orders = [self._ui_order([self._combo_line(self.sub_groups[0])])['data'] for _index in range(2)]
+        ui_orders[1].update(to_invoice=True, partner_id=self.customer.id)
+        deferred, invoiced = self.env['pos.order']._prepare_combo_orders(ui_orders)
+        self.assertEqual(deferred['combo_expansion_state'], 'pending')
+        self.assertEqual(invoiced['combo_expansion_state'], 'expanded')
+        self.assertFalse(any(line[2].get('product_sub_group_id') for line in invoiced['lines']))
+
+    def test_concurrency_error_not_quarantined(self):
+        """A concurrency error is left to the retry of the request, a data error quarantines the order"""
+        PosOrder = self.registry['pos.order']
+        with patch.object(PosOrder, '_record_combo_consumption', side_effect=SerializationFailure()), \
+                self.assertRaises(SerializationFailure):
+            self._create_orders([self._ui_order([self._combo_line(self.sub_groups[0])])])
+
+        with patch.object(PosOrder, '_record_combo_consumption', side_effect=ValueError('Corrupt line')):
+            order = self._create_orders([self._ui_order([self._combo_line(self.sub_groups[0])])])
+        self.assertEqual(order.combo_expansion_state, 'failed')
+        self.assertIn('Corrupt line', order.combo_expansion_error)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+from .common import create_combo_catalog
+
+
+@tagged('post_install', '-at_install')
+class TestProductGroupImport(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _group, _sub_groups, cls.components = create_combo_catalog(cls.env, name='Import Rolex')
+
+    def _import(self, **row):
+        return self.env['product.group']._import_catalog_rows([
+            dict({'group': 'Imported', 'sub_group': 'Imported 1000', 'price': 1000,
+                  'component': self.components[0].name}, **row),
+        ])
+
+    def test_import_zero_sequence(self):
+        """A 0 sequence is imported as is, only an empty cell takes the default"""
+        self._import(sequence=0)
+        sub_group = self.env['product.group.sub'].search([('name', '=', 'Imported 1000')])
+        self.assertEqual(sub_group.sequence, 0)
+        self._import(sequence='')
+        self.assertEqual(sub_group.sequence, 10)
+
+    def test_import_zero_quantity(self):
+        """A 0 component quantity is rejected instead of being imported as 1"""
+        with self.assertRaises(UserError):
+            self._import(quantity=0)
+        with self.assertRaises(UserError):
+            self._import(quantity='0')
+        self._import(quantity=None)
+        sub_group = self.env['product.group.sub'].search([('name', '=', 'Imported 1000')])
+        self.assertEqual(sub_group.component_ids.quantity, 1.0)
+
+    def _json_rows(self, rows):
+        wizard = self.env['product.group.import'].create({
+            'file': base64.b64encode(json.dumps(rows).encode()),
+            'filename': 'catalog.json',
+        })
+        return wizard._read_rows()
+
+    def test_import_json_numbers(self):
+        """JSON cells are numbers, booleans or null, not only strings"""
+        rows = self._json_rows([
+            {'group': 'Imported', 'sub_group': 'Imported 1500', 'price': 1500, 'sequence': 3,
+             'component': self.components[0].name, 'quantity': 2.5},
+            {'group': 'Imported', 'sub_group': 'Imported 1500', 'price': 1500.0, 'sequence': None,
+             'component': self.components[1].name, 'quantity': None},
+        ])
+        self.env['product.group']._import_catalog_rows(rows)
+        sub_group = self.env['product.group.sub'].search([('name', '=', 'Imported 1500')])
+        self.assertEqual((sub_group.price, sub_group.sequence), (1500.0, 3))
+        self.assertEqual(sub_group.component_ids.mapped('quantity'), [2.5, 1.0])
+
+    def test_import_json_invalid_cells(self):
+        """A cell of the wrong JSON type is reported with its row, like any invalid value"""
+        rows = self._json_rows([
+            {'group': 'Imported', 'sub_group': 'Imported 1500', 'price': True,
+             'component': self.components[0].name, 'quantity': 1},
+            {'group': 12, 'sub_group': 'Imported 2000', 'price': 2000, 'component': None},
+        ])
+        with self.assertRaisesRegex(UserError, 'Row 1'):
+            self.env['product.group']._import_catalog_rows(rows)
+
+    def test_create_templates(self):
+        """Each created group gets its own product template"""
+        groups = self.env['product.group'].create([{'name': f'Created {index}'} for index in range(3)])
+        self.assertEqual(groups.product_template_id.mapped('name'), groups.mapped('name'))
+        self.assertEqual(groups.product_template_id.mapped('product_group_id'), groups)
+
+
+@tagged('post_install', '-at_install')
+class TestProductGroupMaintenance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        group = cls.env['product.group'].create({'name': 'Resequenced'})
+        cls.sub_groups = cls.env['product.group.sub'].create([{
+            'name': f'Resequenced {index}',
+            'price': 1000.0 + 100.0 * (index % 5),
+            'sequence': index,
+            'product_group_id': group.id,
+        } for index in range(200)])
+        cls.env.flush_all()
+
+    def test_resequence(self):
+        """A resequence writes each sub group once and never its product template"""
+        Template = self.registry['product.template']
+        with patch.object(Template, 'write', autospec=True, side_effect=Template.write) as template_write, \
+                self.assertQueryCount(len(self.sub_groups) + 5):
+            # One write per record, like the drag and drop of the list view
+            for index, sub_group in enumerate(self.sub_groups):
+                sub_group.write({'sequence': -index})
+        template_write.assert_not_called()
+
+    def test_reprice(self):
+        """A repricing writes the product templates once per distinct price"""
+        Template = self.registry['product.template']
+        with patch.object(Template, 'write', autospec=True, side_effect=Template.write) as template_write:
+            self.sub_groups.write({'price': 2500.0})
+        self.assertEqual(template_write.call_count, 1)
+        self.assertEqual(set(self.sub_groups.product_template_id.mapped('list_price')), {2500.0})
+
+    def test_hide_all_sub_groups_from_pos(self):
+        """The upgrade hides the sub group products shown in POS in one write"""
+        shown = self.sub_groups[:50].product_template_id
+        shown.write({'available_in_pos': True})
+        Template = self.registry['product.template']
+        with patch.object(Template, 'write', autospec=True, side_effect=Template.write) as template_write:
+            self.assertEqual(self.env['product.group.sub']._hide_all_sub_groups_from_pos(), len(shown))
+        self.assertEqual(template_write.call_count, 1)
+        self.assertFalse(any(self.sub_groups.product_template_id.mapped('available_in_pos')))
+
+    def test_unlink_nested_sub_group(self):
+        """A sub group used in another recipe cannot be deleted, with a message naming the recipe"""
+        child, parent = self.sub_groups[:2]
+        parent.component_ids = [Command.create({'child_sub_group_id': child.id, 'quantity': 1.0})]
+        template = child.product_template_id
+        with self.assertRaisesRegex(UserError, parent.name):
+            child.unlink()
+        self.assertTrue(template.exists())
+        # Deleted together with the sub groups nesting it
+        (child | parent).unlink()
+        self.assertFalse(child.exists())
+
+
+@tagged('post_install', '-at_install')
+class TestProductGroupCatalogDelta(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group, cls.sub_groups, _components = create_combo_catalog(cls.env, name='Delta Rolex')
+        cls.other_group, _sub_groups, _components = create_combo_catalog(cls.env, name='Delta Kikomando')
+
+    def _commit_catalog(self):
+        """Run the precommit hooks bumping the catalog version, as a commit would"""
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+
+    def test_unlink_reported(self):
+        """Registers up to date learn about deleted groups and sub groups"""
+        ProductGroup = self.env['product.group']
+        self._commit_catalog()
+        delta = ProductGroup.get_pos_catalog_delta()
+
+        deleted_sub_group = self.sub_groups[0]
+        deleted_sub_group.unlink()
+        self._commit_catalog()
+        delta = ProductGroup.get_pos_catalog_delta(since=delta['since'], version=delta['version'])
+        self.assertFalse(delta['unchanged'])
+        self.assertNotIn(deleted_sub_group.id, delta['sub_group_ids'])
+        self.assertIn(self.sub_groups[1].id, delta['sub_group_ids'])
+
+        deleted_group = self.other_group
+        deleted_group.unlink()
+        self._commit_catalog()
+        delta = ProductGroup.get_pos_catalog_delta(since=delta['since'], version=delta['version'])
+        self.assertFalse(delta['unchanged'])
+        self.assertNotIn(deleted_group.id, delta['group_ids'])
+        self.assertIn(self.group.id, delta['group_ids'])
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import json
+
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+
+class ProductGroupImport(models.TransientModel):
+    _name = 'product.group.import'
+    _description = 'Import Product Groups'
+
+    file = fields.Binary(string='File', required=True,
+                         help='CSV or JSON file with the columns group, sub_group, price, sequence, component and quantity')
+    filename = fields.Char(string='File Name')
+    chunk_size = fields.Integer(string='Groups per Batch', default=500,
+                                help='Number of product groups created and committed together')
+
+    def _read_rows(self):
+        self.ensure_one()
+        content = base64.b64decode(self.file)
+        if (self.filename or '').lower().endswith('.json'):
+            try:
+                rows = json.loads(content)
+            except ValueError as e:
+                raise UserError(_('Invalid JSON file: %s', e))
+            if isinstance(rows, dict):
+                rows = rows.get('rows', [])
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise UserError(_('The JSON file must contain a list of rows'))
+            return rows
+        try:
+            return list(csv.DictReader(io.StringIO(content.decode('utf-8-sig'))))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise UserError(_('Invalid CSV file: %s', e))
+
+    def action_import(self):
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError(_('The batch size must be greater than 0'))
+        stats = self.env['product.group']._import_catalog_rows(
+            self._read_rows(), chunk_size=self.chunk_size, commit=True)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Product Groups Imported'),
+                'message': _(
+                    '%(rows)s rows imported in %(elapsed)s s: %(groups)s groups and %(sub_groups)s sub groups '
+                    'created, %(updated)s sub groups updated, %(components)s components created.',
+                    rows=stats['rows'], elapsed=stats['elapsed'], groups=stats['groups_created'],
+                    sub_groups=stats['sub_groups_created'], updated=stats['sub_groups_updated'],
+                    components=stats['components_created'],
+                ),
+                'type': 'success',
+                'sticky': True,
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }